@@ -297,6 +297,12 @@ TAX_RATE = Decimal("0.05")
    # Securiter supplementaire requis en production
 # ................................................. #
 
+# Moteur de session : 'store.sessions' garde les sessions dans le cache et ne les
+# recopie en base qu'au plus toutes les STORE_SESSION_PERSIST_INTERVAL secondes
+# (cache partagé type Redis requis en production ; purge : commande purge_sessions)
+SESSION_ENGINE = env('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+STORE_SESSION_PERSIST_INTERVAL = env.int('STORE_SESSION_PERSIST_INTERVAL', default=5 * 60)
+
 # Gestion de niveau de securiter à revoir en production
 SESSION_COOKIE_SECURE = False     # cookies uniquement en HTTPS
 CSRF_COOKIE_SECURE = False
@@ -319,6 +325,73 @@ CINETPAY_API_KEY = env("CINETPAY_API_KEY")
 CINETPAY_SITE_ID = env("CINETPAY_SITE_ID")
 CINETPAY_SECRET_KEY = env("CINETPAY_SECRET_KEY")
 
+# Passerelle de paiement : 'store.payments.CinetPayGateway' ou, hors ligne, 'store.payments.StubGateway'
+STORE_PAYMENT_BACKEND = env('STORE_PAYMENT_BACKEND', default='store.payments.CinetPayGateway')
+# Délais d'attente (connexion, lecture) en secondes et nombre de nouvelles tentatives
+STORE_PAYMENT_TIMEOUT = (env.float('STORE_PAYMENT_CONNECT_TIMEOUT', default=5), env.float('STORE_PAYMENT_READ_TIMEOUT', default=15))
+STORE_PAYMENT_RETRIES = env.int('STORE_PAYMENT_RETRIES', default=2)
+# Connexions HTTP persistantes conservées par processus vers l'API de paiement
+STORE_PAYMENT_MAX_CONNECTIONS = env.int('STORE_PAYMENT_MAX_CONNECTIONS', default=10)
+# Simulateur : issue ('accept', 'refuse', 'decline', 'error') et latence simulée en secondes
+STORE_PAYMENT_STUB_OUTCOME = env('STORE_PAYMENT_STUB_OUTCOME', default='accept')
+STORE_PAYMENT_STUB_LATENCY = env.float('STORE_PAYMENT_STUB_LATENCY', default=0)
+
 # ................................................. #
   # Fin de la configuration de Cinetpay
 # ................................................. #
+
+
+# ................................................. #
+  # Debut de la configuration du cache
+# ................................................. #
+
+# Cache local par défaut, à remplacer par Redis/Memcached en production
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='ashxpress'),
+    }
+}
+
+# Durée de vie des fragments communs (menu, bandeaux, blogs...)
+# Ils sont de toute façon invalidés par les signaux à chaque modification
+STORE_CHROME_CACHE_TIMEOUT = env.int('STORE_CHROME_CACHE_TIMEOUT', default=60 * 60)
+
+# Pages publiques (accueil, fiches produit) mises en cache pour les visiteurs anonymes,
+# invalidées à chaque modification d'un produit, d'une image ou d'un avis (0 pour désactiver)
+STORE_PAGE_CACHE_TIMEOUT = env.int('STORE_PAGE_CACHE_TIMEOUT', default=60 * 10)
+
+# Images imagekit : registre des fichiers générés (une clé de cache par fichier, pas de storage.exists
+# à l'affichage) ; chaque processus retient ceux qu'il a vus pendant N secondes (commande warm_imagekit_manifest)
+IMAGEKIT_DEFAULT_CACHEFILE_BACKEND = 'store.imagecache.ManifestBackend'
+STORE_IMAGEKIT_MANIFEST_REFRESH = env.int('STORE_IMAGEKIT_MANIFEST_REFRESH', default=60)
+
+# ................................................. #
+  # Fin de la configuration du cache
+# ................................................. #
+
+
+# ................................................. #
+  # Debut de la configuration de la boutique
+# ................................................. #
+
+# Nombre de produits chargés par page / par défilement infini
+STORE_PRODUCTS_PER_PAGE = env.int('STORE_PRODUCTS_PER_PAGE', default=12)
+
+# Configuration de racinisation PostgreSQL pour la recherche plein texte
+STORE_SEARCH_CONFIG = env('STORE_SEARCH_CONFIG', default='french')
+
+# Meilleures ventes : fenêtre affichée (7, 30 ou 90 jours) et taille des classements
+STORE_BESTSELLER_WINDOW = env.int('STORE_BESTSELLER_WINDOW', default=30)
+STORE_BESTSELLER_LIMIT = env.int('STORE_BESTSELLER_LIMIT', default=10)
+
+# File d'envoi des e-mails (commande send_queued_emails) : tentatives et délai initial (s) entre deux essais
+STORE_EMAIL_MAX_ATTEMPTS = env.int('STORE_EMAIL_MAX_ATTEMPTS', default=5)
+STORE_EMAIL_RETRY_BACKOFF = env.int('STORE_EMAIL_RETRY_BACKOFF', default=60)
+
+# Variantes d'images pré-générées : processus d'encodage (défaut : nombre de CPU)
+STORE_RENDITION_WORKERS = env.int('STORE_RENDITION_WORKERS', default=None)
+
+# ................................................. #
+  # Fin de la configuration de la boutique
+# ................................................. #
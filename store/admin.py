@@ -1,11 +1,14 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.text import slugify
 from mptt.admin import DraggableMPTTAdmin
 from .models import (
     Product, ProductImage, ProductFeature, Category, NewsLetter, Banner,
     BestSeller, Toast, Blog, Cta, Promotion, PromoCode, OrderItem, Order,
-    CartItem, Cart, ReviewRating, LegalContent
+    CartItem, Cart, ReviewRating, LegalContent, BestSellerRanking, OutgoingEmail
 )
+from .exports import EXPORT_FORMATS
 
 
 # --- Inlines pour les produits (inchangé) ---
@@ -65,6 +68,43 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('status', 'paid', 'created_at')
     # Pré-charge l'utilisateur pour éviter une requête dans __str__
     list_select_related = ('user',)
+    # Montants figés à la validation de la commande
+    readonly_fields = ('subtotal', 'tax', 'discount', 'total')
+    actions = ['mark_processing', 'mark_shipped', 'mark_delivered', 'export_csv', 'export_jsonl']
+
+    def _update_status(self, request, queryset, status):
+        # Une requête pour toutes les commandes ; les notifications partent par commande modifiée
+        updated = queryset.update_status(status)
+        self.message_user(request, f"{updated} commande(s) passée(s) au statut « {Order.StatusChoices(status).label} ».")
+
+    @admin.action(description="Marquer comme en traitement")
+    def mark_processing(self, request, queryset):
+        self._update_status(request, queryset, Order.StatusChoices.PROCESSING)
+
+    @admin.action(description="Marquer comme expédiées")
+    def mark_shipped(self, request, queryset):
+        self._update_status(request, queryset, Order.StatusChoices.SHIPPED)
+
+    @admin.action(description="Marquer comme livrées")
+    def mark_delivered(self, request, queryset):
+        self._update_status(request, queryset, Order.StatusChoices.DELIVERED)
+
+    def _export(self, queryset, export_format):
+        # Réponse produite au fil de la lecture : aucune commande n'est gardée en mémoire.
+        # « Tout sélectionner » exporte toutes les commandes du filtre courant (statut, payé, date)
+        iter_rows, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(iter_rows(queryset), content_type=f"{content_type}; charset=utf-8")
+        filename = f"commandes-{timezone.now():%Y%m%d-%H%M}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description="Exporter en CSV (une ligne par article)")
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+
+    @admin.action(description="Exporter en JSONL (une commande par ligne)")
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, 'jsonl')
 
 @admin.register(ReviewRating)
 class ReviewRatingAdmin(admin.ModelAdmin):
@@ -86,6 +126,32 @@ class PromoCodeAdmin(admin.ModelAdmin):
 
 admin.site.register(Banner)
 admin.site.register(BestSeller)
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('builder', 'dedup_key', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'builder')
+    search_fields = ('dedup_key',)
+    readonly_fields = ('builder', 'payload', 'dedup_key', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description="Renvoyer au prochain passage")
+    def retry_now(self, request, queryset):
+        queryset.update(status=OutgoingEmail.StatusChoices.PENDING, next_attempt_at=timezone.now(), attempts=0)
+
+@admin.register(BestSellerRanking)
+class BestSellerRankingAdmin(admin.ModelAdmin):
+    # Calculé par la commande compute_bestsellers : consultation seule
+    list_display = ('window_days', 'rank', 'product', 'units', 'revenue', 'computed_at')
+    list_filter = ('window_days',)
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 admin.site.register(Toast)
 admin.site.register(Blog)
 admin.site.register(Cta)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import AggregationWatermark, BestSellerRanking, Order, OrderItem, Product, ProductSalesDay
+
+# Fenêtres glissantes calculées (en jours)
+BESTSELLER_WINDOWS = (7, 30, 90)
+# Nombre de produits conservés par fenêtre
+BESTSELLER_LIMIT = getattr(settings, 'STORE_BESTSELLER_LIMIT', 10)
+# Marge de recouvrement : une transaction validée juste après le passage précédent
+# peut porter un updated_at légèrement antérieur au point de reprise
+WATERMARK_OVERLAP = timedelta(minutes=5)
+WATERMARK_NAME = 'product_sales_day'
+
+
+def _counted_items():
+    """ Lignes de commande prises en compte : commandes payées et non annulées. """
+    return OrderItem.objects.filter(
+        order__paid=True, product__isnull=False
+    ).exclude(order__status=Order.StatusChoices.CANCELED)
+
+
+# Gestion du cumul journalier des ventes
+def refresh_sales_days(full=False):
+    """
+    Met à jour ProductSalesDay pour les seuls jours touchés par des commandes
+    créées ou modifiées depuis le dernier passage (paiement, annulation...).
+    Chaque jour concerné est recalculé entièrement en une requête groupée,
+    ce qui rend l'opération idempotente. Retourne le nombre de jours recalculés.
+    """
+    started_at = timezone.now()
+    watermark, _ = AggregationWatermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    orders = Order.objects.all()
+    if not full and watermark.value:
+        orders = orders.filter(updated_at__gt=watermark.value - WATERMARK_OVERLAP)
+    days = set(
+        orders.annotate(day=TruncDate('created_at')).order_by().values_list('day', flat=True).distinct()
+    )
+
+    rows = []
+    if days:
+        rows = (
+            _counted_items()
+            .annotate(day=TruncDate('order__created_at'))
+            .filter(day__in=days)
+            .order_by()
+            .values('product_id', 'day')
+            .annotate(
+                total_units=Sum('quantity'),
+                total_revenue=Sum(ExpressionWrapper(
+                    F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+                )),
+            )
+        )
+
+    with transaction.atomic():
+        if full:
+            ProductSalesDay.objects.all().delete()
+        elif days:
+            ProductSalesDay.objects.filter(day__in=days).delete()
+        ProductSalesDay.objects.bulk_create(
+            [
+                ProductSalesDay(
+                    product_id=row['product_id'], day=row['day'],
+                    units=row['total_units'], revenue=row['total_revenue'] or 0,
+                )
+                for row in rows
+            ],
+            batch_size=500,
+        )
+        watermark.value = started_at
+        watermark.save(update_fields=['value'])
+    return len(days)
+
+
+# Gestion des classements
+def compute_rankings(windows=BESTSELLER_WINDOWS, limit=BESTSELLER_LIMIT):
+    """
+    Recalcule le classement de chaque fenêtre depuis le cumul journalier
+    (une requête groupée par fenêtre, sur une table bien plus petite que OrderItem).
+    """
+    today = timezone.localdate()
+    rankings = []
+    for window in windows:
+        top = (
+            ProductSalesDay.objects
+            .filter(day__gt=today - timedelta(days=window))
+            .values('product_id')
+            .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'))
+            .order_by('-total_units', '-total_revenue', 'product_id')[:limit]
+        )
+        rankings.extend(
+            BestSellerRanking(
+                window_days=window, rank=position, product_id=row['product_id'],
+                units=row['total_units'], revenue=row['total_revenue'],
+            )
+            for position, row in enumerate(top, start=1)
+        )
+
+    with transaction.atomic():
+        BestSellerRanking.objects.filter(window_days__in=windows).delete()
+        BestSellerRanking.objects.bulk_create(rankings)
+    # Les meilleures ventes sont affichées dans le "site chrome"
+    bump_version('chrome')
+    return rankings
+
+
+def refresh_bestsellers(full=False):
+    days = refresh_sales_days(full=full)
+    return days, compute_rankings()
+
+
+def top_products(window, limit):
+    """ Produits les mieux classés d'une fenêtre, dans l'ordre du classement. """
+    return list(
+        Product.objects
+        .filter(bestseller_rankings__window_days=window, bestseller_rankings__rank__lte=limit)
+        .order_by('bestseller_rankings__rank')
+    )
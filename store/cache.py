@@ -0,0 +1,60 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Gestion des clés de cache versionnées
+def version_key(namespace):
+    return f"store:{namespace}:version"
+
+
+def get_version(namespace):
+    """
+    Retourne la version courante d'un espace de cache.
+    La version est initialisée avec un horodatage pour ne jamais réutiliser
+    d'anciennes entrées après une éviction du compteur.
+    """
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key, int(time.time()))
+    return version
+
+
+def bump_version(namespace):
+    """
+    Invalide toutes les entrées d'un espace en incrémentant sa version.
+    """
+    key = version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Le compteur a été évincé : on repart sur une nouvelle base
+        version = int(time.time())
+        cache.set(key, version, None)
+        return version
+
+
+def bump_version_on_commit(namespace):
+    """
+    Invalide l'espace une fois la transaction en cours validée : une requête
+    concurrente ne peut plus reconstruire l'entrée à partir des anciennes lignes
+    sous la nouvelle version (entrée périmée jusqu'à l'invalidation suivante).
+    """
+    transaction.on_commit(partial(bump_version, namespace))
+
+
+def get_or_build(namespace, name, builder, timeout=None):
+    """
+    Lit une entrée de l'espace versionné, ou la construit et la stocke.
+    """
+    key = f"store:{namespace}:{get_version(namespace)}:{name}"
+    sentinel = object()
+    value = cache.get(key, sentinel)
+    if value is sentinel:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,273 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .cache import bump_version
+from .models import Category, Product, ProductFeature, ProductImage
+from .search import index_products
+from .slugs import allocate_slugs, slug_base
+
+# Produits écrits par transaction (un INSERT ... ON CONFLICT par lot)
+IMPORT_BATCH_SIZE = 1000
+
+# Colonnes d'un produit (CSV et JSONL) ; features et images sont des listes JSON
+CATALOG_FIELDS = [
+    'slug', 'name', 'subname', 'current_price', 'original_price', 'badge', 'stock', 'status',
+    'category', 'description', 'thumbnail', 'scroll_image', 'features', 'images',
+]
+# Champs recopiés sur un produit existant (même slug)
+UPDATE_FIELDS = [
+    'name', 'subname', 'current_price', 'original_price', 'badge', 'stock', 'status', 'category',
+    'description', 'thumbnail', 'scroll_image', 'thumbnail_digest', 'scroll_image_digest', 'updated_at',
+]
+SLUG_LENGTH = Product._meta.get_field('slug').max_length
+STATUSES = {value for value, _ in Product.STATUS_CHOICES}
+
+
+class CatalogError(ValueError):
+    """ Ligne du fichier impossible à importer (la ligne est ignorée, l'import continue). """
+
+
+# Gestion de la lecture et de l'écriture des fichiers
+def read_rows(stream, fmt):
+    """
+    Lignes du fichier, lues au fil de l'eau et décodées par import_catalog :
+    dictionnaires (CSV, features et images encore en JSON) ou lignes JSON brutes.
+    Une ligne illisible est ainsi ignorée sans interrompre l'import.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def write_rows(stream, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            for key in ('features', 'images'):
+                row[key] = json.dumps(row[key], ensure_ascii=False)
+            writer.writerow(row)
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+
+
+# Gestion de l'export
+def export_rows(chunk_size=IMPORT_BATCH_SIZE):
+    """ Catalogue complet, lu par lots (caractéristiques et images préchargées par lot). """
+    products = (
+        Product.objects.select_related('category').prefetch_related('features', 'images')
+        .order_by('pk').iterator(chunk_size=chunk_size)
+    )
+    for product in products:
+        yield {
+            'slug': product.slug,
+            'name': product.name,
+            'subname': product.subname or '',
+            'current_price': product.current_price,
+            'original_price': product.original_price if product.original_price is not None else '',
+            'badge': product.badge or '',
+            'stock': product.stock,
+            'status': product.status or '',
+            'category': product.category.slug if product.category else '',
+            'description': product.description or '',
+            'thumbnail': product.thumbnail.name or '',
+            'scroll_image': product.scroll_image.name or '',
+            'features': [{'name': f.name, 'value': f.value} for f in product.features.all()],
+            'images': [{'image': i.image.name or '', 'legende': i.legende} for i in product.images.all()],
+        }
+
+
+# Gestion de l'import
+def _decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise CatalogError(f"{field} manquant")
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise CatalogError(f"{field} invalide : {value!r}")
+
+
+def _decode(row):
+    """ Dictionnaire d'une ligne brute de read_rows (ou déjà décodée) ; lève CatalogError. """
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            raise CatalogError(f"JSON invalide : {e}")
+    if not isinstance(row, dict):
+        raise CatalogError("la ligne n'est pas un objet JSON")
+    return row
+
+
+def _related(row, key):
+    """ Liste d'objets de la colonne features ou images (None si absente) ; lève CatalogError. """
+    value = row.get(key)
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise CatalogError(f"{key} : JSON invalide ({e})")
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise CatalogError(f"{key} : liste d'objets attendue")
+    return value
+
+
+def _clean(row, categories):
+    """ Valeurs du produit à partir d'une ligne du fichier ; lève CatalogError. """
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise CatalogError("nom manquant")
+    status = row.get('status') or None
+    if status and status not in STATUSES:
+        raise CatalogError(f"statut inconnu : {status!r}")
+    category = row.get('category') or None
+    if category and category not in categories:
+        raise CatalogError(f"catégorie inconnue : {category!r}")
+    try:
+        stock = int(row.get('stock') or 0)
+    except ValueError:
+        raise CatalogError(f"stock invalide : {row.get('stock')!r}")
+    return {
+        'slug': row.get('slug') or '',
+        'name': name,
+        'subname': row.get('subname') or None,
+        'current_price': _decimal(row.get('current_price'), 'current_price', required=True),
+        'original_price': _decimal(row.get('original_price'), 'original_price'),
+        'badge': row.get('badge') or None,
+        'stock': stock,
+        'status': status,
+        'category_id': categories[category] if category else None,
+        'description': row.get('description') or None,
+        'thumbnail': row.get('thumbnail') or '',
+        'scroll_image': row.get('scroll_image') or None,
+    }
+
+
+def _allocate_slugs(values):
+    """ Slug des nouveaux produits du lot (ceux dont la ligne n'en donne pas), en une requête. """
+    missing = [value for value in values if not value['slug']]
+    if not missing:
+        return
+    bases = [slug_base(value['name'], SLUG_LENGTH, fallback='produit') for value in missing]
+    reserved = {value['slug'] for value in values if value['slug']}
+    for value, slug in zip(missing, allocate_slugs(Product, bases, reserved=reserved)):
+        value['slug'] = slug
+
+
+def _import_batch(batch):
+    """
+    Écrit un lot de lignes déjà nettoyées : un INSERT ... ON CONFLICT (slug) DO UPDATE
+    pour les produits, puis les caractéristiques et images des lignes qui en donnent,
+    remplacées en bloc. Retourne les identifiants des produits écrits.
+    """
+    values = [value for value, _ in batch]
+    _allocate_slugs(values)
+    # Les lignes en double dans un même lot : la dernière l'emporte
+    by_slug = {value['slug']: (value, extra) for value, extra in batch}
+
+    existing = {
+        row['slug']: row
+        for row in Product.objects.filter(slug__in=by_slug).order_by()
+        .values('slug', 'thumbnail', 'scroll_image', 'thumbnail_digest', 'scroll_image_digest')
+    }
+    products = []
+    for slug, (value, _) in by_slug.items():
+        product = Product(**value)
+        current = existing.get(slug)
+        for name in ('thumbnail', 'scroll_image'):
+            # Les variantes déjà générées restent valables si l'image n'a pas changé
+            if current and (current[name] or '') == (getattr(product, name).name or ''):
+                setattr(product, f"{name}_digest", current[f"{name}_digest"])
+        products.append(product)
+
+    Product.objects.bulk_create(
+        products, update_conflicts=True, unique_fields=['slug'], update_fields=UPDATE_FIELDS,
+    )
+    ids = dict(Product.objects.filter(slug__in=by_slug).order_by().values_list('slug', 'id'))
+
+    features, images = [], []
+    replace_features, replace_images = [], []
+    for slug, (_, extra) in by_slug.items():
+        product_id = ids[slug]
+        if extra['features'] is not None:
+            replace_features.append(product_id)
+            features.extend(
+                ProductFeature(product_id=product_id, name=item.get('name'), value=item.get('value'))
+                for item in extra['features']
+            )
+        if extra['images'] is not None:
+            replace_images.append(product_id)
+            images.extend(
+                ProductImage(product_id=product_id, image=item.get('image') or None, legende=item.get('legende'))
+                for item in extra['images']
+            )
+    if replace_features:
+        ProductFeature.objects.filter(product_id__in=replace_features).delete()
+        ProductFeature.objects.bulk_create(features)
+    if replace_images:
+        old_images = ProductImage.objects.filter(product_id__in=replace_images)
+        # Une image reprise telle quelle garde ses variantes (non supprimées par cleanup_renditions)
+        digests = {
+            (pid, name or ''): digest
+            for pid, name, digest in old_images.values_list('product_id', 'image', 'image_digest')
+        }
+        for image in images:
+            image.image_digest = digests.get((image.product_id, image.image.name or ''), '')
+        old_images.delete()
+        ProductImage.objects.bulk_create(images)
+    return list(ids.values())
+
+
+def import_catalog(rows, batch_size=IMPORT_BATCH_SIZE, on_error=None):
+    """
+    Crée ou met à jour les produits décrits par `rows` (dictionnaires ou lignes de
+    read_rows ; le slug identifie le produit, sans slug le produit est créé avec un
+    slug tiré de son nom), par lots de `batch_size` produits, chacun dans sa transaction.
+    Les insertions groupées n'émettent pas de signaux : l'index de recherche est mis à
+    jour lot par lot, les caches des pages et des catégories sont invalidés à la fin.
+    `on_error(line, error)` est appelé pour chaque ligne ignorée.
+    Retourne le nombre de produits écrits.
+    """
+    categories = dict(Category.objects.values_list('slug', 'id'))
+    written = 0
+
+    def flush(batch):
+        with transaction.atomic():
+            ids = _import_batch(batch)
+        index_products(ids)
+        return len(ids)
+
+    batch = []
+    for line, row in enumerate(rows, start=1):
+        try:
+            row = _decode(row)
+            value = _clean(row, categories)
+            extra = {key: _related(row, key) for key in ('features', 'images')}
+        except (CatalogError, TypeError, ValueError) as e:
+            # Valeur d'un type inattendu (ex. une liste à la place du stock) : ligne ignorée aussi
+            if on_error:
+                on_error(line, e if isinstance(e, CatalogError) else CatalogError(f"valeur invalide : {e}"))
+            continue
+        batch.append((value, extra))
+        if len(batch) >= batch_size:
+            written += flush(batch)
+            batch = []
+    if batch:
+        written += flush(batch)
+
+    if written:
+        bump_version('pages')
+        bump_version('categories')
+    return written
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count
+
+from .cache import get_or_build
+from .models import Category
+
+# Durée de vie de l'arbre en cache (il est de toute façon invalidé par les signaux)
+CATEGORY_TREE_TIMEOUT = getattr(settings, 'STORE_CHROME_CACHE_TIMEOUT', 60 * 60)
+
+
+# Gestion de l'arbre des catégories
+def build_category_tree():
+    """
+    Construit l'arbre complet en une requête : les nœuds sont lus dans l'ordre
+    MPTT (tree_id, lft), ce qui donne chaque parent avant ses enfants, et les
+    bornes lft/rght suffisent à rattacher chaque nœud à ses ancêtres.
+    Chaque nœud est un dictionnaire (sérialisable dans n'importe quel cache) avec
+    product_count, le nombre de produits de la catégorie et de ses descendantes.
+    """
+    roots, stack = [], []
+    categories = (
+        Category.objects.annotate(direct_count=Count('products'))
+        .order_by('tree_id', 'lft')
+        .values('id', 'name', 'slug', 'category_image', 'stock', 'tree_id', 'lft', 'rght', 'level', 'direct_count')
+    )
+    for row in categories:
+        while stack and (stack[-1]['tree_id'] != row['tree_id'] or stack[-1]['rght'] < row['lft']):
+            stack.pop()
+        node = {
+            'id': row['id'], 'name': row['name'], 'slug': row['slug'], 'stock': row['stock'],
+            'image_url': default_storage.url(row['category_image']) if row['category_image'] else '',
+            'tree_id': row['tree_id'], 'lft': row['lft'], 'rght': row['rght'], 'level': row['level'],
+            'product_count': row['direct_count'], 'children': [],
+        }
+        for ancestor in stack:
+            ancestor['product_count'] += row['direct_count']
+        (stack[-1]['children'] if stack else roots).append(node)
+        stack.append(node)
+    return roots
+
+
+def category_tree():
+    """ Arbre des catégories (racines avec leurs enfants), lu dans le cache. """
+    return get_or_build('categories', 'tree', build_category_tree, CATEGORY_TREE_TIMEOUT)
+
+
+def iter_categories(nodes=None):
+    """ Parcourt tous les nœuds de l'arbre en cache, dans l'ordre du menu. """
+    for node in category_tree() if nodes is None else nodes:
+        yield node
+        yield from iter_categories(node['children'])
+
+
+def find_category(slug):
+    """ Nœud de l'arbre en cache correspondant au slug, ou None. """
+    return next((node for node in iter_categories() if node['slug'] == slug), None)
+
+
+def category_choices():
+    """ Choix du filtre de catégorie, indentés selon la profondeur. """
+    return [(node['slug'], f"{'— ' * node['level']}{node['name']}") for node in iter_categories()]
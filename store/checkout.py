@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest, Now
+
+from .models import Order, OrderItem, Product
+
+
+class InsufficientStock(Exception):
+    """ Un produit de la commande n'a pas assez de stock (ou n'existe plus). """
+
+    def __init__(self, product_name, requested, available):
+        self.product_name = product_name
+        self.requested = requested
+        self.available = available
+        super().__init__(f"{product_name} : {requested} demandé(s), {available} disponible(s)")
+
+
+# Gestion de la validation d'une commande
+@transaction.atomic
+def place_order(order, lines, promo_code=None):
+    """
+    Enregistre une commande et réserve le stock en un nombre fixe de requêtes,
+    quelle que soit la taille du panier :
+
+    1. verrouillage des produits concernés (SELECT ... FOR UPDATE, par id croissant
+       pour que deux paiements simultanés prennent les verrous dans le même ordre) ;
+    2. contrôle des quantités en mémoire ;
+    3. insertion de toutes les lignes avec bulk_create ;
+    4. décrémentation du stock par un seul UPDATE ... CASE qui ne touche
+       que les lignes dont le stock reste positif.
+
+    `order` est une commande non sauvegardée (issue du formulaire, utilisateur
+    ou session déjà renseignés) ; `lines` une suite de (id produit, quantité).
+    Lève InsufficientStock, la transaction est alors annulée.
+    """
+    quantities = OrderedDict()
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    products = {
+        product.id: product
+        for product in Product.objects.select_for_update().filter(id__in=quantities).order_by('id')
+    }
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            raise InsufficientStock('', quantity, 0)
+        if product.stock < quantity:
+            raise InsufficientStock(product.name, quantity, product.stock)
+
+    subtotal = sum((products[pid].current_price * quantity for pid, quantity in quantities.items()), Decimal('0'))
+    discount_percentage = 0
+    if promo_code and promo_code.is_valid():
+        order.promo_code = promo_code
+        discount_percentage = promo_code.discount_percentage
+    # Montants figés une fois pour toutes : l'affichage de la commande ne relit ni les lignes ni le code promo
+    order.freeze_amounts(subtotal, discount_percentage)
+    order.total_paid = order.subtotal - order.discount
+    order.save()
+
+    # bulk_create n'émet pas post_save : units_sold est mis à jour avec le stock ci-dessous
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=pid, price=products[pid].current_price, quantity=quantity)
+        for pid, quantity in quantities.items()
+    ])
+
+    # Ne peut échouer que sur un moteur sans verrou de ligne : la transaction est alors annulée
+    _take_stock(quantities)
+    return order
+
+
+def _take_stock(quantities):
+    """
+    Décrémente le stock des produits par un seul UPDATE ... CASE qui ne touche que
+    les lignes dont le stock reste positif ; lève InsufficientStock sinon.
+    """
+    enough_stock = Q()
+    for pid, quantity in quantities.items():
+        enough_stock |= Q(id=pid, stock__gte=quantity)
+    updated = Product.objects.filter(enough_stock).update(
+        stock=Case(*[When(id=pid, then=F('stock') - quantity) for pid, quantity in quantities.items()]),
+        units_sold=Case(*[When(id=pid, then=F('units_sold') + quantity) for pid, quantity in quantities.items()]),
+        updated_at=Now(),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock('', sum(quantities.values()), 0)
+
+
+def _order_quantities(order):
+    quantities = OrderedDict()
+    for product_id, quantity in order.items.filter(product__isnull=False).values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+# Gestion d'un paiement confirmé après l'annulation de la commande
+def reinstate_order(order):
+    """
+    Reprend le stock d'une commande annulée (verrouillée par l'appelant) dont le
+    paiement arrive finalement. Retourne False, sans rien modifier, si un des
+    produits n'a plus assez de stock : la commande doit alors être remboursée.
+    """
+    quantities = _order_quantities(order)
+    if not quantities:
+        return True
+    try:
+        with transaction.atomic():
+            # Savepoint : une partie des lignes a pu être décrémentée avant l'échec
+            _take_stock(quantities)
+    except InsufficientStock:
+        return False
+    return True
+
+
+# Gestion de l'annulation (compensation d'un paiement échoué)
+@transaction.atomic
+def cancel_order(order_id):
+    """
+    Annule une commande non payée et remet ses articles en stock, en un seul UPDATE.
+    Sans effet si la commande est déjà payée ou annulée : un paiement refusé
+    peut être signalé plusieurs fois sans rendre le stock deux fois.
+    Retourne la commande annulée, ou None.
+    """
+    order = (
+        Order.objects.select_for_update()
+        .filter(pk=order_id, paid=False)
+        .exclude(status=Order.StatusChoices.CANCELED)
+        .first()
+    )
+    if order is None:
+        return None
+
+    quantities = _order_quantities(order)
+    if quantities:
+        Product.objects.filter(id__in=quantities).update(
+            stock=Case(*[When(id=pid, then=F('stock') + quantity) for pid, quantity in quantities.items()]),
+            units_sold=Case(*[
+                When(id=pid, then=Greatest(F('units_sold') - quantity, Value(0))) for pid, quantity in quantities.items()
+            ]),
+            updated_at=Now(),
+        )
+
+    order.status = Order.StatusChoices.CANCELED
+    order.save(update_fields=['status', 'updated_at'])
+    return order
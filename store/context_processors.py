@@ -1,48 +1,63 @@
+from django.conf import settings
 from django.utils import timezone
-from .models import Category, Banner, Cta, Blog, Toast, BestSeller, Promotion, LegalContent, Cart
+from django.utils.functional import SimpleLazyObject
+from .bestsellers import top_products
+from .cache import get_or_build
+from .categories import category_tree
+from .pagecache import is_page_shell
+from .models import Banner, Cta, Blog, Toast, Promotion, LegalContent, Cart
 
-def global_context(request):
+# Durée de vie des fragments du "site chrome" (la version les invalide avant)
+CHROME_CACHE_TIMEOUT = getattr(settings, 'STORE_CHROME_CACHE_TIMEOUT', 60 * 60)
+# Fenêtre (en jours) du classement des meilleures ventes affiché
+BESTSELLER_WINDOW = getattr(settings, 'STORE_BESTSELLER_WINDOW', 30)
+
+
+def _chrome(name, builder):
     """
-    Fournit un contexte global et optimisé pour tous les templates.
+    Fragment paresseux : la liste n'est lue dans le cache (ou construite)
+    que si un template y accède réellement.
     """
-    # ✅ LA CORRECTION :
-    # On laisse Django faire la requête optimisée. Il va intelligemment faire un
-    # "WHERE parent_id IN (...)". C'est extrêmement rapide.
-    categories = Category.objects.filter(parent__isnull=True).prefetch_related('children')
-
-    # On récupère les autres éléments nécessaires au base.html
-    promotions = Promotion.objects.filter(
-        start_date__lte=timezone.now(),
-        end_date__gte=timezone.now()
+    return SimpleLazyObject(lambda: get_or_build('chrome', name, builder, CHROME_CACHE_TIMEOUT))
+
+
+def _active_promotions():
+    # Les promotions non terminées sont en cache, le filtre de début se fait à l'affichage
+    now = timezone.now()
+    promotions = get_or_build(
+        'chrome', 'promotions',
+        lambda: list(Promotion.objects.filter(end_date__gte=timezone.now())),
+        CHROME_CACHE_TIMEOUT
     )
-    banners = Banner.objects.all()[:3]
-    bestsellers = BestSeller.objects.all()[:4]
-    toast = Toast.objects.order_by('-add_date').first()
-    blogs = Blog.objects.all()[:4]
-    cta = Cta.objects.first()
-
-    # Calcul du nombre d'articles dans le panier (votre logique était déjà bonne)
-    cart_count = 0
+    return [promo for promo in promotions if promo.start_date <= now <= promo.end_date]
+
+
+def _cart_count(request):
+    if is_page_shell(request):
+        return 0
+    carts = Cart.objects.with_totals().select_related('promo_code')
     if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            cart_count = cart.items.count()
+        cart = carts.filter(user=request.user).first()
     else:
         session_key = request.session.session_key
-        if session_key:
-            cart = Cart.objects.filter(session_key=session_key).first()
-            if cart:
-                cart_count = cart.items.count()
+        cart = carts.filter(session_key=session_key).first() if session_key else None
+    return cart.totals.items_count if cart else 0
+
 
+def global_context(request):
+    """
+    Fournit un contexte global et optimisé pour tous les templates.
+    Les données communes (menu, bandeaux, blogs...) sont matérialisées une fois
+    dans le cache et invalidées par les signaux des modèles concernés.
+    """
     return {
-        'categories': categories,
-        'banners': banners,
-        'bestsellers': bestsellers,
-        'toast': toast,
-        'blogs': blogs,
-        'cta': cta,
-        'promotions': promotions,
-        'cart_count': cart_count,
-        'legal_pages': LegalContent.objects.all()[:6],
+        'categories': SimpleLazyObject(category_tree),
+        'banners': _chrome('banners', lambda: list(Banner.objects.all()[:3])),
+        'bestsellers': _chrome('bestsellers', lambda: top_products(BESTSELLER_WINDOW, 4)),
+        'toast': _chrome('toast', lambda: Toast.objects.order_by('-add_date').first()),
+        'blogs': _chrome('blogs', lambda: list(Blog.objects.all()[:4])),
+        'cta': _chrome('cta', lambda: Cta.objects.first()),
+        'promotions': SimpleLazyObject(_active_promotions),
+        'cart_count': SimpleLazyObject(lambda: _cart_count(request)),
+        'legal_pages': _chrome('legal_pages', lambda: list(LegalContent.objects.all()[:6])),
     }
-
@@ -0,0 +1,54 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from .models import Product, ProductLike, ReviewRating, OrderItem
+
+
+# Gestion des compteurs dénormalisés des produits
+def adjust_counters(product_id, **deltas):
+    """
+    Ajoute des deltas aux compteurs d'un produit en une seule requête UPDATE.
+    Les valeurs sont calculées par la base (F()), sans lecture préalable,
+    et ne descendent jamais sous zéro.
+    """
+    if product_id is None or not deltas:
+        return
+    Product.objects.filter(pk=product_id).update(updated_at=Now(), **{
+        field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()
+    })
+
+
+def touch_product(product_id):
+    """ Marque un produit comme modifié (image, caractéristique ou avis changé). """
+    if product_id is not None:
+        Product.objects.filter(pk=product_id).update(updated_at=Now())
+
+
+def _aggregate(model, value, relation='product'):
+    """ Sous-requête agrégée par produit, 0 si aucune ligne. """
+    subquery = (
+        model.objects.filter(**{relation: OuterRef('pk')})
+        .order_by()
+        .values(relation)
+        .annotate(total=value)
+        .values('total')
+    )
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+COUNTER_EXPRESSIONS = {
+    'likes_count': lambda: _aggregate(ProductLike, Count('id')),
+    'reviews_count': lambda: _aggregate(ReviewRating, Count('id')),
+    'rating_sum': lambda: _aggregate(ReviewRating, Sum('rating')),
+    'units_sold': lambda: _aggregate(OrderItem, Sum('quantity')),
+}
+
+
+def rebuild_counters(queryset=None, fields=None):
+    """
+    Recalcule les compteurs depuis les tables sources en un seul UPDATE
+    à base de sous-requêtes corrélées. Retourne le nombre de produits mis à jour.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    fields = fields or list(COUNTER_EXPRESSIONS)
+    return queryset.update(updated_at=Now(), **{field: COUNTER_EXPRESSIONS[field]() for field in fields})
@@ -1,78 +1,109 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.dateparse import parse_datetime
 from django.utils.html import strip_tags
 from django.utils.translation import gettext_lazy as _
 from config import settings
 #from .models import Order
 from .models import NewsLetter, Order
+from .outbox import enqueue_email
+
+
+def build_html_email(subject, template_name, context, recipient):
+    """
+    Construit un e-mail HTML avec sa version texte simple,
+    pour les clients de messagerie qui ne supportent pas le HTML.
+    """
+    html_message = render_to_string(template_name, context)
+    message = EmailMultiAlternatives(
+        subject=str(subject),
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
 
 
 # Gestion de notification des commandes
-def send_order_notification(order_id, is_new_order=False):
+def build_order_notification(order_id, is_new_order=False, status=None, changed_at=None, language=None):
     """
-    Envoie un e-mail de notification de commande.
-    - Si is_new_order est True, envoie l'e-mail de confirmation.
-    - Sinon, envoie un e-mail de mise à jour de statut.
+    Construit l'e-mail de notification de commande, au moment de l'envoi.
+    - Si is_new_order est True, l'e-mail de confirmation.
+    - Sinon, l'e-mail de mise à jour de statut, rendu avec le statut et la date
+      de l'événement mis en file (la commande a pu changer encore depuis).
+    Le message est rendu dans la langue active lors de la mise en file.
     """
     try:
         order = Order.objects.get(id=order_id)
+    except Order.DoesNotExist:
+        print(f"Erreur : Impossible d'envoyer un e-mail, commande {order_id} non trouvée.")
+        return None
 
+    # Valeurs de l'événement, en mémoire seulement (la commande n'est pas enregistrée)
+    if status:
+        order.status = status
+    if changed_at:
+        order.updated_at = parse_datetime(changed_at)
+
+    with translation.override(language or settings.LANGUAGE_CODE):
         if is_new_order:
             subject = _("Votre commande #{} a bien été reçue").format(order.id)
             template_name = 'store/emails/order_confirmation.html'
         else:
             subject = _("Mise à jour du statut de votre commande #{}").format(order.id)
             template_name = 'store/emails/order_status_update.html'
+        return build_html_email(subject, template_name, {'order': order}, order.email)
 
-        context = {'order': order}
-
-        # Rendu du template HTML
-        html_message = render_to_string(template_name, context)
-
-        # Version texte simple pour les clients de messagerie qui ne supportent pas le HTML
-        plain_message = strip_tags(html_message)
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.email],
-            html_message=html_message,
-            fail_silently=False
-            # Mettez à True en production si vous ne voulez pas qu'une erreur d'e-mail bloque le processus
-        )
-        print(f"E-mail de notification envoyé pour la commande {order_id}")
-
-    except Order.DoesNotExist:
-        print(f"Erreur : Impossible d'envoyer un e-mail, commande {order_id} non trouvée.")
-    except Exception as e:
-        # En production, il est préférable d'utiliser un système de logging
-        print(f"Une erreur critique est survenue lors de l'envoi de l'e-mail pour la commande {order_id}: {e}")
+def send_order_notification(order_id, is_new_order=False, status=None, changed_at=None):
+    """
+    Met en file l'e-mail de notification de commande (envoyé par la commande
+    send_queued_emails). Un même événement n'est mis en file qu'une fois : un
+    changement de statut est identifié par sa date (`changed_at`), une commande
+    qui revient à un statut déjà eu est donc notifiée à nouveau.
+    Le statut, la date et la langue courante font partie de l'e-mail mis en file.
+    """
+    payload = {'order_id': order_id, 'is_new_order': is_new_order, 'language': translation.get_language()}
+    if is_new_order:
+        event = 'created'
+    else:
+        payload['status'] = status
+        payload['changed_at'] = changed_at.isoformat() if changed_at else None
+        event = f"status:{status or ''}:{payload['changed_at'] or ''}"
+    enqueue_email(
+        'store.emails.build_order_notification',
+        payload,
+        dedup_key=f"order:{order_id}:{event}",
+    )
+    print(f"E-mail de notification mis en file pour la commande {order_id}")
 
 # Gestion de notification abonnements
-def send_newsletter_subscription_email(subscription_id):
+def build_newsletter_subscription_email(subscription_id):
     """
-    Envoie un e-mail de confirmation à un nouvel abonné de la newsletter.
+    Construit l'e-mail de confirmation d'un nouvel abonné de la newsletter.
     """
     try:
         subscription = NewsLetter.objects.get(id=subscription_id)
-        subject = _("Merci pour votre abonnement à notre newsletter !")
-
-        context = {'subscription': subscription}
-        html_message = render_to_string('store/emails/newsletter_subscription.html', context)
-        plain_message = strip_tags(html_message)
-
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[subscription.email],
-            html_message=html_message,
-        )
-        print(f"E-mail de confirmation de newsletter envoyé à {subscription.email}")
     except NewsLetter.DoesNotExist:
         print(f"Erreur : Impossible d'envoyer l'e-mail, abonnement {subscription_id} non trouvé.")
-    except Exception as e:
-        print(f"Une erreur est survenue lors de l'envoi de l'e-mail de newsletter : {e}")
+        return None
+
+    return build_html_email(
+        _("Merci pour votre abonnement à notre newsletter !"),
+        'store/emails/newsletter_subscription.html',
+        {'subscription': subscription},
+        subscription.email,
+    )
 
 
+def send_newsletter_subscription_email(subscription_id):
+    """
+    Met en file l'e-mail de confirmation à un nouvel abonné de la newsletter.
+    """
+    enqueue_email(
+        'store.emails.build_newsletter_subscription_email',
+        {'subscription_id': subscription_id},
+        dedup_key=f"newsletter:{subscription_id}",
+    )
@@ -0,0 +1,97 @@
+import csv
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order
+
+# Taille des lots lus par le curseur serveur (.iterator)
+EXPORT_CHUNK_SIZE = 2000
+
+# Colonnes de la commande (répétées sur chaque ligne d'article du CSV)
+ORDER_FIELDS = {
+    'order_id': 'id',
+    'created_at': 'created_at',
+    'status': 'status',
+    'paid': 'paid',
+    'transaction_id': 'transaction_id',
+    'customer_id': 'user_id',
+    'customer_username': 'user__username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'phone': 'phone',
+    'address': 'address',
+    'postal_code': 'postal_code',
+    'city': 'city',
+    'promo_code': 'promo_code__code',
+    'promo_percentage': 'promo_code__discount_percentage',
+    'subtotal': 'subtotal',
+    'tax': 'tax',
+    'discount': 'discount',
+    'total': 'total',
+    'total_paid': 'total_paid',
+}
+# Colonnes de l'article (vides pour une commande sans article)
+ITEM_FIELDS = {
+    'product_id': 'items__product_id',
+    'product_name': 'items__product__name',
+    'product_slug': 'items__product__slug',
+    'price': 'items__price',
+    'quantity': 'items__quantity',
+}
+
+
+def order_rows(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Articles des commandes `orders` (queryset déjà filtré), avec la commande, le client
+    et le code promo joints dans la même requête, lus par lots de `chunk_size` :
+    la mémoire reste constante quel que soit le nombre de commandes.
+    Les articles sont joints par LEFT JOIN : une commande sans article donne une
+    ligne dont les colonnes d'article sont vides (None).
+    Les lignes sont des dictionnaires, triées par commande.
+    """
+    lookups = {**ORDER_FIELDS, **ITEM_FIELDS}
+    rows = (
+        Order.objects.filter(pk__in=orders.order_by().values('pk'))
+        .order_by('pk', 'items__pk')
+        .values_list(*lookups.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    names = list(lookups)
+    for row in rows:
+        yield dict(zip(names, row))
+
+
+class _Echo:
+    """ Pseudo-fichier pour csv.writer : write() retourne la ligne au lieu de l'écrire. """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """ Export CSV, une ligne par article commandé (une seule, sans article, pour une commande vide). """
+    columns = [*ORDER_FIELDS, *ITEM_FIELDS]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in order_rows(orders, chunk_size):
+        yield writer.writerow([row[column] for column in columns])
+
+
+def iter_jsonl(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """ Export JSON Lines, un objet par commande avec la liste de ses articles. """
+    for order_id, rows in groupby(order_rows(orders, chunk_size), key=itemgetter('order_id')):
+        rows = list(rows)
+        order = {field: rows[0][field] for field in ORDER_FIELDS}
+        # Le prix n'est vide que pour la ligne d'une commande sans article
+        order['items'] = [{field: row[field] for field in ITEM_FIELDS} for row in rows if row['price'] is not None]
+        yield json.dumps(order, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'jsonl': (iter_jsonl, 'application/x-ndjson'),
+}
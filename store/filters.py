@@ -1,17 +1,20 @@
 import django_filters
-from store.models import Product, Category
+from store.categories import category_choices, find_category
+from store.models import Product
+from store.search import search_products
 
 
 class ProductFilter(django_filters.FilterSet):
+    # Recherche plein texte classée par pertinence (voir store.search)
     name = django_filters.CharFilter(
-        lookup_expr='icontains',
+        method='filter_search',
         label='Nom du produit'
     )
 
-    category = django_filters.ModelChoiceFilter(
-        queryset=Category.objects.all(),
-        field_name="category__slug",
-        to_field_name="slug",
+    # Choix lus dans l'arbre des catégories en cache : aucune requête pour valider le slug
+    category = django_filters.ChoiceFilter(
+        choices=category_choices,
+        method='filter_category',
         label="Catégorie"
     )
 
@@ -19,3 +22,20 @@ class ProductFilter(django_filters.FilterSet):
         model = Product
         fields = ['name', 'category']
 
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
+
+    def filter_category(self, queryset, name, value):
+        """
+        Produits de la catégorie choisie et de toutes ses sous-catégories :
+        l'intervalle MPTT du nœud, lu dans l'arbre en cache, devient une condition
+        de plage (tree_id, lft BETWEEN lft AND rght) sur la jointure avec la catégorie,
+        servie par l'index (tree_id, lft), au lieu d'une liste IN des descendantes.
+        """
+        node = find_category(value)
+        if node is None:
+            return queryset.none()
+        return queryset.filter(
+            category__tree_id=node['tree_id'],
+            category__lft__range=(node['lft'], node['rght']),
+        )
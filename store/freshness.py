@@ -0,0 +1,74 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+from .cache import get_version
+from .likes import liked_products
+from .models import Order, Product
+from .pagecache import PAGE_NAMESPACES
+
+
+# Gestion des requêtes conditionnelles (ETag / Last-Modified)
+def _visitor_state(request, product_ids=None):
+    """
+    Partie de la page propre au visiteur connecté : ses likes (lus dans le
+    cache) et ses commandes (droit de laisser un avis). Vide pour un invité,
+    qui reçoit la page partagée (voir store.pagecache).
+    """
+    if not request.user.is_authenticated:
+        return ''
+    liked = liked_products(request)
+    if product_ids is not None:
+        liked = [pid for pid in product_ids if pid in liked]
+    latest_order = Order.objects.filter(user=request.user).aggregate(latest=Max('updated_at'))['latest']
+    return f"{request.user.pk}:{','.join(map(str, liked))}:{latest_order}"
+
+
+def _etag(request, *parts):
+    versions = '.'.join(str(get_version(namespace)) for namespace in PAGE_NAMESPACES)
+    raw = '|'.join(map(str, (request.get_full_path(), get_language(), versions, *parts)))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _freshness(request, compute):
+    """ ETag et date de modification, calculés une seule fois par requête. """
+    if not hasattr(request, '_freshness'):
+        request._freshness = compute()
+    return request._freshness
+
+
+def _product_freshness(request, slug):
+    def compute():
+        product = Product.objects.filter(slug=slug).values('id', 'updated_at').first()
+        if product is None:
+            return None, None
+        state = _visitor_state(request, [product['id']])
+        return _etag(request, product['updated_at'].isoformat(), state), product['updated_at']
+    return _freshness(request, compute)
+
+
+def _listing_freshness(request):
+    def compute():
+        # Plus récente modification de tout le catalogue : lecture de l'index sur updated_at ;
+        # les créations et suppressions changent aussi la version de l'espace 'pages'
+        latest = Product.objects.aggregate(latest=Max('updated_at'))['latest']
+        state = _visitor_state(request)
+        ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        return _etag(request, latest and latest.isoformat(), state, ajax), latest
+    return _freshness(request, compute)
+
+
+# Fiche produit : 304 Not Modified sans rendu tant que le produit, ses images,
+# caractéristiques et avis, le menu et l'état du visiteur sont inchangés
+conditional_product_page = condition(
+    etag_func=lambda request, slug: _product_freshness(request, slug)[0],
+    last_modified_func=lambda request, slug: _product_freshness(request, slug)[1],
+)
+
+# Liste des produits (accueil, filtres, défilement infini)
+conditional_listing_page = condition(
+    etag_func=lambda request: _listing_freshness(request)[0],
+    last_modified_func=lambda request: _listing_freshness(request)[1],
+)
@@ -0,0 +1,88 @@
+import posixpath
+import threading
+import time
+
+from django.conf import settings
+from imagekit.cachefiles.backends import CacheFileState, Simple
+from imagekit.utils import sanitize_cache_key
+
+# Délai (s) au-delà duquel un processus oublie les fichiers qu'il sait exister
+MANIFEST_REFRESH = getattr(settings, 'STORE_IMAGEKIT_MANIFEST_REFRESH', 60)
+# Nombre de clés écrites par appel set_many lors de l'enregistrement en masse
+REGISTER_BATCH_SIZE = 1000
+
+
+# Gestion du registre des images générées par imagekit
+class ManifestBackend(Simple):
+    """
+    Backend imagekit qui retient les fichiers déjà générés.
+    Le registre partagé est fait d'une clé de cache par fichier (celle du backend
+    Simple) : un ajout est une simple écriture, sans relire ni réécrire le reste.
+    Chaque processus garde en plus l'ensemble des fichiers qu'il sait exister,
+    oublié toutes les MANIFEST_REFRESH secondes : la résolution d'une URL déjà vue
+    devient une recherche dans un ensemble, sans accès au cache ni au stockage.
+    Les fichiers inconnus suivent le chemin du backend Simple.
+    Après un déploiement ou un nettoyage de media/CACHE, remplir le registre avec
+    la commande warm_imagekit_manifest.
+    """
+
+    def __init__(self):
+        self._known = set()
+        self._loaded_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _key(self, name):
+        return sanitize_cache_key(f"{settings.IMAGEKIT_CACHE_PREFIX}{name}-state")
+
+    def get_key(self, file):
+        return self._key(file.name)
+
+    def known(self):
+        """ Fichiers que ce processus sait exister (vidé toutes les MANIFEST_REFRESH secondes). """
+        now = time.monotonic()
+        if now - self._loaded_at > MANIFEST_REFRESH:
+            with self._lock:
+                self._known = set()
+                self._loaded_at = now
+        return self._known
+
+    def register(self, names):
+        """ Enregistre des fichiers existants dans le registre partagé, par lots de clés. """
+        names = list(names)
+        for start in range(0, len(names), REGISTER_BATCH_SIZE):
+            batch = names[start:start + REGISTER_BATCH_SIZE]
+            self.cache.set_many(
+                {self._key(name): CacheFileState.EXISTS for name in batch}, settings.IMAGEKIT_CACHE_TIMEOUT
+            )
+        self.known().update(names)
+
+    def get_state(self, file, check_if_unknown=True):
+        if file.name in self.known():
+            return CacheFileState.EXISTS
+        # Clé du fichier, puis stockage : set_state l'enregistre s'il existe
+        state = super().get_state(file, check_if_unknown)
+        if state == CacheFileState.EXISTS:
+            self.known().add(file.name)
+        return state
+
+    def set_state(self, file, state):
+        super().set_state(file, state)
+        if state == CacheFileState.EXISTS:
+            self.known().add(file.name)
+        else:
+            self.known().discard(file.name)
+
+
+def scan_cache_files(storage, root='CACHE'):
+    """ Parcourt le dossier des images générées et retourne les noms des fichiers. """
+    names = []
+    pending = [root]
+    while pending:
+        path = pending.pop()
+        try:
+            directories, files = storage.listdir(path)
+        except FileNotFoundError:
+            continue
+        names.extend(posixpath.join(path, name) for name in files)
+        pending.extend(posixpath.join(path, name) for name in directories)
+    return names
@@ -0,0 +1,82 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ProductLike
+from .pagecache import is_page_shell
+
+# Durée de vie de l'ensemble des likes d'un visiteur dans le cache
+LIKES_CACHE_TIMEOUT = getattr(settings, 'STORE_LIKES_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _owner_key(user_id=None, session_key=None):
+    if user_id:
+        return f"store:likes:user:{user_id}"
+    if session_key:
+        return f"store:likes:session:{session_key}"
+    return None
+
+
+class LikedProducts:
+    """
+    Identifiants des produits aimés par un visiteur, triés dans un tableau
+    compact (array d'entiers non signés) : test d'appartenance par dichotomie.
+    """
+
+    def __init__(self, product_ids=()):
+        self.ids = array('L', sorted(set(product_ids)))
+
+    def __contains__(self, product_id):
+        index = bisect_left(self.ids, product_id)
+        return index < len(self.ids) and self.ids[index] == product_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Gestion de l'ensemble des likes du visiteur
+def liked_products(request):
+    """
+    Ensemble des likes du visiteur courant : lu une fois par requête dans le
+    cache, ou construit en une requête au premier accès. Un invité sans session
+    n'a aucun like, sans accès à la base, pas plus que la page partagée
+    (voir store.pagecache) : ses likes sont marqués par le JavaScript.
+    """
+    if is_page_shell(request):
+        return LikedProducts()
+    if not hasattr(request, '_liked_products'):
+        user_id = request.user.pk if request.user.is_authenticated else None
+        key = _owner_key(user_id, request.session.session_key)
+        liked = cache.get(key) if key else LikedProducts()
+        if liked is None:
+            owner = {'user_id': user_id} if user_id else {'session_key': request.session.session_key}
+            liked = LikedProducts(ProductLike.objects.filter(**owner).values_list('product_id', flat=True))
+            cache.set(key, liked, LIKES_CACHE_TIMEOUT)
+        request._liked_products = liked
+    return request._liked_products
+
+
+def mark_liked(request, products):
+    """ Renseigne product.is_liked pour chaque produit, sans requête. """
+    liked = liked_products(request)
+    for product in products:
+        product.is_liked = product.id in liked
+    return products
+
+
+def forget_liked_products(like):
+    """
+    Oublie l'ensemble en cache du propriétaire d'un like créé ou supprimé, une
+    fois la transaction validée : il est relu en base au prochain accès. Pas de
+    lecture-modification-écriture, qui perdrait l'un de deux likes rapprochés,
+    ni de cache modifié par une transaction ensuite annulée.
+    """
+    key = _owner_key(like.user_id, like.session_key)
+    if key:
+        transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Order
+
+AMOUNT_FIELDS = ['subtotal', 'tax', 'discount', 'total']
+
+
+class Command(BaseCommand):
+    help = (
+        "Fige les montants (sous-total, TVA, réduction, total) des commandes antérieures "
+        "qui n'en ont pas encore, par lots. Peut être relancée sans risque."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = Order.objects.filter(subtotal__isnull=True).with_subtotal().select_related('promo_code').order_by('pk')
+        updated = 0
+        last_pk = 0
+        while True:
+            orders = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not orders:
+                break
+            for order in orders:
+                self.freeze(order)
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, AMOUNT_FIELDS)
+            updated += len(orders)
+            last_pk = orders[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f"Montants figés pour {updated} commande(s)."))
+
+    def freeze(self, order):
+        subtotal = order.items_subtotal
+        percentage = order.promo_code.discount_percentage if order.promo_code else 0
+        order.freeze_amounts(subtotal, percentage)
+        # La réduction réellement accordée se lit dans total_paid (sous-total - réduction à la
+        # validation) : le pourcentage du code promo a pu changer, ou le code être supprimé
+        if Decimal('0') < order.total_paid < subtotal:
+            order.discount = subtotal - order.total_paid
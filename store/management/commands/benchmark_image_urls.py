@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+from imagekit.utils import get_singleton
+
+from store.imagecache import ManifestBackend, scan_cache_files
+from store.models import Product
+
+BACKENDS = ('imagekit.cachefiles.backends.Simple', 'store.imagecache.ManifestBackend')
+BENCHMARK_CACHE = 'imagekit-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compte les accès au stockage (storage.exists) et au cache d'imagekit par page affichée, "
+        "avec le backend Simple puis avec le registre (ManifestBackend). "
+        "Le cache d'imagekit est isolé dans un cache local vidé avant chaque mesure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths', help="Page à mesurer (répétable).")
+        parser.add_argument('--repeat', type=int, default=3, help="Nombre d'affichages par page.")
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        storage = storages[settings.IMAGEKIT_DEFAULT_FILE_STORAGE]
+        client = Client(HTTP_HOST=options['host'])
+
+        for backend_path in BACKENDS:
+            isolated = {**settings.CACHES, BENCHMARK_CACHE: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': backend_path,
+            }}
+            with override_settings(CACHES=isolated, IMAGEKIT_CACHE_BACKEND=BENCHMARK_CACHE,
+                                   IMAGEKIT_DEFAULT_CACHEFILE_BACKEND=backend_path):
+                cache = caches[BENCHMARK_CACHE]
+                cache.clear()
+                backend = get_singleton(backend_path, 'cache file backend')
+                backend._cache = cache
+                if isinstance(backend, ManifestBackend):
+                    backend.register(scan_cache_files(storage))
+
+                self.stdout.write(f"\n{backend_path}")
+                with mock.patch.object(type(storage), 'exists', autospec=True,
+                                       side_effect=type(storage).exists) as exists, \
+                        mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+                    for path in paths:
+                        for run in range(1, options['repeat'] + 1):
+                            exists.reset_mock()
+                            cache_get.reset_mock()
+                            status = client.get(path).status_code
+                            self.stdout.write(
+                                f"  {path} [{status}] affichage {run} : "
+                                f"{exists.call_count} storage.exists, {cache_get.call_count} lecture(s) du cache"
+                            )
+                backend._cache = None
+
+        self.stdout.write(self.style.SUCCESS("\nMesure terminée."))
+
+    def default_paths(self):
+        paths = ['/']
+        product = Product.objects.order_by('-id').first()
+        if product:
+            paths.append(reverse('product', args=[product.slug]))
+        return paths
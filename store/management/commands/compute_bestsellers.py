@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.bestsellers import refresh_bestsellers
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule les meilleures ventes (fenêtres de 7, 30 et 90 jours) à partir des commandes payées. "
+        "Incrémental : seuls les jours touchés depuis le dernier passage sont recalculés. "
+        "À planifier régulièrement (cron, ex. toutes les 15 minutes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recalcule tout l'historique au lieu de repartir du dernier point de reprise."
+        )
+
+    def handle(self, *args, **options):
+        days, rankings = refresh_bestsellers(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} jour(s) de ventes recalculé(s), {len(rankings)} entrée(s) de classement."
+        ))
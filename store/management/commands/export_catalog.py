@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from store.catalog import export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = "Exporte le catalogue (produits, caractéristiques, images) en CSV ou JSONL, relisible par import_catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Par défaut : déduit de l'extension.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'jsonl')
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        with open(options['path'], 'w', encoding='utf-8', newline='') as stream:
+            write_rows(stream, counted(export_rows()), fmt)
+        self.stdout.write(self.style.SUCCESS(f"{count} produit(s) exporté(s) dans {options['path']}."))
@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les commandes avec leurs articles, le client et le code promo en CSV "
+        "(une ligne par article ; colonnes d'article vides pour une commande sans article) ou JSONL "
+        "(une commande par ligne), en flux continu : "
+        "la mémoire reste constante quel que soit le nombre de commandes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="Fichier de sortie (par défaut : sortie standard).")
+        parser.add_argument('--status', action='append', choices=Order.StatusChoices.values, help="Répétable.")
+        parser.add_argument('--paid', choices=['yes', 'no'])
+        parser.add_argument('--since', help="Date de création minimale (AAAA-MM-JJ, incluse).")
+        parser.add_argument('--until', help="Date de création maximale (AAAA-MM-JJ, incluse).")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['status']:
+            orders = orders.filter(status__in=options['status'])
+        if options['paid']:
+            orders = orders.filter(paid=options['paid'] == 'yes')
+        for option, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lte')):
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f"Date invalide pour --{option} : {options[option]}")
+                orders = orders.filter(**{lookup: day})
+
+        iter_rows, _ = EXPORT_FORMATS[options['format']]
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else None
+        write = output.write if output else partial(self.stdout.write, ending='')
+        try:
+            lines = 0
+            for line in iter_rows(orders, options['chunk_size']):
+                write(line)
+                lines += 1
+        finally:
+            if output:
+                output.close()
+
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"{lines} ligne(s) écrite(s) dans {options['output']}."))
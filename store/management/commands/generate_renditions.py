@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from store.cache import bump_version
+from store.models import Product, ProductImage
+from store.renditions import RENDITION_FAILED, generate_renditions
+from store.signals import RENDITION_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-génère les variantes responsives (320/640/1280, AVIF/WebP/JPEG) des images produit "
+        "dans une réserve de processus. Par défaut, seules les images en attente (nouvelles ou "
+        "remplacées) sont traitées ; les images en échec ne sont reprises qu'avec --all. "
+        "Avec --loop, tourne en continu (processus de fond) et traite les envois de l'admin "
+        "quelques secondes après leur enregistrement ; sinon, à planifier régulièrement (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Retraite aussi les images déjà générées ou en échec.")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=None, help="Nombre de processus (défaut : nombre de CPU).")
+        parser.add_argument('--loop', action='store_true', help="Ne s'arrête pas quand il n'y a plus d'image en attente.")
+        parser.add_argument('--interval', type=float, default=5, help="Pause (s) sans image en attente, avec --loop.")
+
+    def handle(self, *args, **options):
+        if options['all'] and options['loop']:
+            raise CommandError("--all et --loop ne peuvent pas être combinés.")
+        totals = {model: [0, 0] for model in RENDITION_FIELDS}
+        while True:
+            done = 0
+            for model in RENDITION_FIELDS:
+                processed, failed = self.process(model, options)
+                totals[model][0] += processed
+                totals[model][1] += failed
+                done += processed
+            if done:
+                # Les pages en cache référencent encore les images d'origine
+                bump_version('pages')
+            if not options['loop']:
+                break
+            if not done:
+                time.sleep(options['interval'])
+
+        for model, (done, failed) in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{model.__name__} : {done} objet(s) traité(s), {failed} image(s) en échec."
+            ))
+
+    def process(self, model, options):
+        fields = RENDITION_FIELDS[model]
+        queryset = model.objects.order_by('pk')
+        if not options['all']:
+            missing = Q()
+            for name in fields:
+                missing |= (~Q(**{name: ''}) & ~Q(**{f"{name}__isnull": True}) & Q(**{f"{name}_digest": ''}))
+            queryset = queryset.filter(missing)
+
+        done = failed = 0
+        objects = list(queryset.only('pk', *fields))
+        for start in range(0, len(objects), options['batch_size']):
+            batch = objects[start:start + options['batch_size']]
+            files = [getattr(obj, name) for obj in batch for name in fields if getattr(obj, name)]
+            try:
+                digests = generate_renditions(files, max_workers=options['workers'])
+            except (OSError, ValueError):
+                # Un fichier illisible fait échouer le lot : on le reprend image par image
+                digests = {}
+                for field_file in files:
+                    try:
+                        digests.update(generate_renditions([field_file]))
+                    except (OSError, ValueError) as e:
+                        # Marquée en échec : l'original reste affiché, l'image n'est plus reprise
+                        digests[field_file.name] = RENDITION_FAILED
+                        failed += 1
+                        self.stderr.write(f"{model.__name__} : {field_file.name} ignoré ({e})")
+
+            for obj in batch:
+                files = {name: getattr(obj, name) for name in fields}
+                # Mise à jour conditionnelle : une image remplacée pendant la génération
+                # garde son condensat vide et sera traitée au passage suivant
+                done += model.objects.filter(pk=obj.pk, **{name: f.name for name, f in files.items()}).update(**{
+                    f"{name}_digest": digests.get(f.name, '') if f else '' for name, f in files.items()
+                })
+        return done, failed
@@ -0,0 +1,38 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from store.catalog import IMPORT_BATCH_SIZE, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe un catalogue CSV ou JSONL (format de export_catalog) : création ou mise à jour "
+        "des produits par lots, avec leurs caractéristiques et images de galerie. Les images "
+        "sont des chemins déjà présents dans le stockage ; leurs variantes sont générées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Par défaut : déduit de l'extension.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--skip-renditions', action='store_true',
+            help="Laisse la génération des variantes d'images à un passage ultérieur de generate_renditions."
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'jsonl')
+        errors = 0
+
+        def on_error(line, error):
+            nonlocal errors
+            errors += 1
+            self.stderr.write(f"Ligne {line} ignorée : {error}")
+
+        with open(options['path'], encoding='utf-8', newline='') as stream:
+            written = import_catalog(read_rows(stream, fmt), batch_size=options['batch_size'], on_error=on_error)
+
+        self.stdout.write(self.style.SUCCESS(f"{written} produit(s) importé(s), {errors} ligne(s) ignorée(s)."))
+        if written and not options['skip_renditions']:
+            # Seules les images nouvelles ou remplacées (sans condensat) sont traitées
+            call_command('generate_renditions', stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,40 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from store.models import Cart, ProductLike
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime par lots les sessions expirées, puis les paniers et likes d'invités "
+        "dont la session n'existe plus. À planifier régulièrement (cron, ex. chaque nuit)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        live_sessions = Session.objects.values('session_key')
+
+        sessions = self.purge(Session.objects.filter(expire_date__lt=timezone.now()), batch_size)
+        orphans = Q(user__isnull=True) & (Q(session_key__isnull=True) | ~Q(session_key__in=live_sessions))
+        carts = self.purge(Cart.objects.filter(orphans), batch_size)
+        likes = self.purge(ProductLike.objects.filter(orphans), batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sessions} session(s) expirée(s), {carts} panier(s) et {likes} like(s) d'invités supprimés."
+        ))
+
+    def purge(self, queryset, batch_size):
+        """ Supprime par lots d'identifiants pour ne jamais verrouiller toute la table. """
+        model = queryset.model
+        deleted = 0
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            model.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
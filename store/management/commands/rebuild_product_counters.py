@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.counters import COUNTER_EXPRESSIONS, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs dénormalisés des produits (likes, avis, notes, ventes) depuis les tables sources."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--field', action='append', choices=sorted(COUNTER_EXPRESSIONS), dest='fields',
+            help="Compteur à recalculer (répétable). Par défaut : tous."
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_counters(fields=options['fields'])
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés pour {updated} produits."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import index_products, memory_index, uses_postgres
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des produits (vecteurs PostgreSQL ou index mémoire)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not uses_postgres('default'):
+            memory_index.rebuild()
+            self.stdout.write(self.style.SUCCESS("Index mémoire reconstruit (valable pour ce processus uniquement)."))
+            return
+
+        batch_size = options['batch_size']
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            index_products(ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"{len(ids)} produits réindexés."))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les e-mails en file d'attente par lots, sur une connexion SMTP réutilisée. "
+        "Avec --loop, tourne en continu (processus de fond) ; sinon, à planifier régulièrement (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Ne s'arrête pas quand la file est vide.")
+        parser.add_argument('--interval', type=float, default=5, help="Pause (s) quand la file est vide, avec --loop.")
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'canceled': 0}
+        while True:
+            stats = deliver_pending(batch_size=options['batch_size'])
+            for key, value in stats.items():
+                totals[key] += value
+            if sum(stats.values()) == 0:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['sent']} envoyé(s), {totals['retried']} reprogrammé(s), "
+            f"{totals['failed']} abandonné(s), {totals['canceled']} annulé(s)."
+        ))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from imagekit.cachefiles.backends import get_default_cachefile_backend
+
+from store.imagecache import ManifestBackend, scan_cache_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit le registre des images générées par imagekit en parcourant media/CACHE, "
+        "pour que l'affichage des URL ne consulte plus le stockage. "
+        "À lancer après un déploiement ou un nettoyage du dossier CACHE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default='CACHE', help="Dossier à parcourir dans le stockage.")
+
+    def handle(self, *args, **options):
+        backend = get_default_cachefile_backend()
+        if not isinstance(backend, ManifestBackend):
+            self.stderr.write(
+                f"IMAGEKIT_DEFAULT_CACHEFILE_BACKEND vaut {settings.IMAGEKIT_DEFAULT_CACHEFILE_BACKEND} : "
+                "le registre sera rempli mais pas utilisé."
+            )
+            backend = ManifestBackend()
+
+        names = scan_cache_files(storages[settings.IMAGEKIT_DEFAULT_FILE_STORAGE], options['root'])
+        backend.register(names)
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} fichier(s) enregistré(s) dans le registre imagekit."))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nom')),
+                ('value', models.DateTimeField(blank=True, null=True, verbose_name='Valeur')),
+            ],
+            options={
+                'verbose_name': 'Point de reprise',
+                'verbose_name_plural': 'Points de reprise',
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Mis à jour le'),
+        ),
+        migrations.CreateModel(
+            name='BestSellerRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_days', models.PositiveSmallIntegerField(verbose_name='Fenêtre (jours)')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rang')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Unités vendues')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name="Chiffre d'affaires")),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bestseller_rankings', to='store.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Classement des ventes',
+                'verbose_name_plural': 'Classements des ventes',
+                'ordering': ['window_days', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('window_days', 'rank'), name='unique_bestseller_rank')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True, verbose_name='Jour')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Unités vendues')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name="Chiffre d'affaires")),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to='store.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières',
+                'verbose_name_plural': 'Ventes journalières',
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_sales_day')],
+            },
+        ),
+    ]
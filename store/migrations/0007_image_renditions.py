@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='scroll_image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail_digest',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,9 +1,15 @@
+from collections import namedtuple
 from decimal import Decimal
+from functools import partial
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.utils.text import slugify
+from django.utils.functional import cached_property
+from django.dispatch import Signal
+from django.contrib.postgres.search import SearchVectorField
 from django_ckeditor_5.fields import CKEditor5Field
 from imagekit.models import ImageSpecField
 from mptt.models import MPTTModel, TreeForeignKey
@@ -11,6 +17,7 @@ from pilkit.processors import ResizeToFill
 from django.utils.translation import gettext_lazy as _
 
 from config import settings
+from .slugs import save_with_unique_slug
 
 
 # Gestion des categories
@@ -28,15 +35,17 @@ class Category(MPTTModel):
         verbose_name = _("Catégorie")
         verbose_name_plural = _("Catégories")
 
+    class Meta:
+        # Filtre par sous-arbre : les descendantes d'un nœud sont les lignes du même
+        # arbre dont lft est compris entre ses bornes lft et rght
+        indexes = [
+            models.Index(fields=['tree_id', 'lft'], name='store_category_tree_id_lft_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Category.objects.filter(slug=slug).exclude(id=self.id).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+            # Slug libre choisi en une requête, nouvel essai si un enregistrement concurrent le prend
+            return save_with_unique_slug(self, partial(super().save, *args, **kwargs), self.name)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -69,28 +78,20 @@ class Product(models.Model):
                                  blank=True, related_name="products", db_index=True)
     description = models.TextField(_("Description"), blank=True, null=True)
     add_date = models.DateTimeField(_("Date d'ajout"), auto_now_add=True, db_index=True)
-    # Images optimisées
-    product_image = ImageSpecField(
-        source="thumbnail",
-        processors=[ResizeToFill(1280, 813)],
-        format="JPEG",
-        options={"quality": 90}
-    )
-
-    product_scroll_image = ImageSpecField(
-        source="scroll_image",
-        processors=[ResizeToFill(1280, 813)],
-        format="JPEG",
-        options={"quality": 90}
-    )
-
-    detail_image = ImageSpecField(
-        source="thumbnail",
-        processors=[ResizeToFill(1280, 813)],
-        format="JPEG",
-        options={"quality": 90}
-    )
-
+    # Dernière modification visible (fiche, images, caractéristiques, avis, compteurs, stock) :
+    # les mises à jour groupées le renseignent aussi (voir store.counters et store.checkout)
+    updated_at = models.DateTimeField(_("Mis à jour le"), auto_now=True, db_index=True)
+    # Vecteur de recherche plein texte (PostgreSQL), maintenu par store.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Compteurs dénormalisés, maintenus par les signaux (voir store.signals)
+    likes_count = models.PositiveIntegerField(_("Nombre de likes"), default=0, editable=False)
+    reviews_count = models.PositiveIntegerField(_("Nombre d'avis"), default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(_("Somme des notes"), default=0, editable=False)
+    units_sold = models.PositiveIntegerField(_("Unités vendues"), default=0, editable=False)
+    # Condensats des variantes pré-générées (voir store.renditions), vides tant qu'elles n'existent pas
+    thumbnail_digest = models.CharField(max_length=32, blank=True, editable=False)
+    scroll_image_digest = models.CharField(max_length=32, blank=True, editable=False)
+    # Images optimisées (les visuels du catalogue passent par store.renditions)
     cart_image = ImageSpecField(
         source="thumbnail",
         processors=[ResizeToFill(75, 75)],
@@ -104,6 +105,7 @@ class Product(models.Model):
         ordering = ['-add_date']
         indexes = [
             models.Index(fields=['status', '-add_date']),
+            models.Index(fields=['category', '-add_date']),
         ]
 
     def __str__(self):
@@ -111,12 +113,8 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            original_slug = slugify(self.name)
-            self.slug = original_slug
-            counter = 1
-            while Product.objects.filter(slug=self.slug).exists():
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
+            # Slug libre choisi en une requête, nouvel essai si un enregistrement concurrent le prend
+            return save_with_unique_slug(self, partial(super().save, *args, **kwargs), self.name)
         super().save(*args, **kwargs)
 
     # ✅ NOUVELLE PROPRIÉTÉ POUR VÉRIFIER LE STOCK FACILEMENT
@@ -125,17 +123,24 @@ class Product(models.Model):
         """Vérifie si le produit est en stock."""
         return self.stock > 0
 
+    @property
+    def rating_avg(self):
+        """Note moyenne calculée à partir des compteurs, sans requête."""
+        if not self.reviews_count:
+            return 0
+        return round(self.rating_sum / self.reviews_count, 1)
+
+    @property
+    def rating_stars(self):
+        """Note moyenne arrondie à l'étoile la plus proche (0 à 5)."""
+        return int(self.rating_avg + 0.5)
+
 # Gestion des miniatures de produit
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, verbose_name=_("Produit"), on_delete=models.CASCADE, related_name="images", db_index=True)
     image = models.ImageField(_("Image"), upload_to="galerie", blank=True, null=True)
     legende = models.CharField(_("Légende"), max_length=100, blank=True, null=True)
-    miniature = ImageSpecField(
-        source="image",
-        processors=[ResizeToFill(65, 65)],
-        format="JPEG",
-        options={"quality": 90}
-    )
+    image_digest = models.CharField(max_length=32, blank=True, editable=False)
 
     class Meta:
         verbose_name = _("Miniature de produit")
@@ -329,6 +334,27 @@ class PromoCode(models.Model):
         return self.is_active and self.start_date <= now and self.end_date >= now
 
 # Gestion du panier
+CartTotals = namedtuple('CartTotals', ['subtotal', 'discount', 'total', 'items_count'])
+
+
+def _cart_totals_expressions(prefix=''):
+    """ Sous-total (prix courant x quantité) et nombre d'articles, calculés par la base. """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return {
+        'items_subtotal': Coalesce(
+            Sum(ExpressionWrapper(F(f'{prefix}product__current_price') * F(f'{prefix}quantity'), output_field=money)),
+            Value(Decimal('0.00')), output_field=money
+        ),
+        'items_count': Count(f'{prefix}id'),
+    }
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """ Annote chaque panier de son sous-total et de son nombre d'articles (une seule requête). """
+        return self.annotate(**_cart_totals_expressions('items__'))
+
+
 class Cart(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -357,22 +383,48 @@ class Cart(models.Model):
             return f"{_('Panier de')} {self.user.username}"
         return f"{_('Panier invité')} ({self.session_key})"
 
+    objects = CartQuerySet.as_manager()
+
+    @cached_property
+    def totals(self):
+        """
+        Sous-total, réduction, total et nombre d'articles du panier.
+        Repris des annotations de CartQuerySet.with_totals() si présentes,
+        sinon calculés par une seule requête agrégée ; mis en cache sur l'instance.
+        """
+        if hasattr(self, 'items_subtotal'):
+            subtotal, items_count = self.items_subtotal, self.items_count
+        else:
+            aggregate = self.items.aggregate(**_cart_totals_expressions())
+            subtotal, items_count = aggregate['items_subtotal'], aggregate['items_count']
+        # Certains moteurs (SQLite) ne conservent pas l'échelle des décimaux
+        subtotal = Decimal(subtotal).quantize(Decimal('0.01'))
+
+        discount = 0
+        if self.promo_code and self.promo_code.is_valid():
+            discount = (subtotal * self.promo_code.discount_percentage) / 100
+        return CartTotals(subtotal, discount, subtotal - discount, items_count)
+
+    def invalidate_totals(self):
+        """ À appeler après une modification des articles si les totaux sont relus ensuite. """
+        self.__dict__.pop('totals', None)
+        for name in _cart_totals_expressions():
+            self.__dict__.pop(name, None)
+
     @property
     def subtotal(self):
         """ Le total avant réduction. """
-        return sum(item.subtotal for item in self.items.all())
+        return self.totals.subtotal
 
     @property
     def discount_amount(self):
         """ Le montant de la réduction. """
-        if self.promo_code and self.promo_code.is_valid():
-            return (self.subtotal * self.promo_code.discount_percentage) / 100
-        return 0
+        return self.totals.discount
 
     @property
     def total_price(self):
         """ Le total final après réduction. """
-        return self.subtotal - self.discount_amount
+        return self.totals.total
 
 # Gestion du produit dans le panier
 class CartItem(models.Model):
@@ -410,6 +462,52 @@ class CartItem(models.Model):
             )
 
 # Gestion de la commande.
+# Émis après l'enregistrement d'un changement de statut (arguments : order, previous_status)
+order_status_changed = Signal()
+
+
+class OrderQuerySet(models.QuerySet):
+    def update_status(self, status):
+        """
+        Change le statut des commandes du queryset en une seule requête UPDATE
+        et émet order_status_changed pour chaque commande réellement modifiée.
+        Retourne le nombre de commandes modifiées.
+        """
+        with transaction.atomic(using=self.db):
+            orders = list(self.exclude(status=status).select_related(None).select_for_update().order_by('pk'))
+            if not orders:
+                return 0
+            now = timezone.now()
+            self.model.objects.using(self.db).filter(pk__in=[order.pk for order in orders]).update(
+                status=status, updated_at=now
+            )
+        for order in orders:
+            previous_status, order.status = order.status, status
+            order.updated_at = now
+            order._loaded_status = status
+            order_status_changed.send(sender=self.model, order=order, previous_status=previous_status)
+        return len(orders)
+
+    def with_summary(self, preview=3):
+        """
+        Ajoute à chaque commande le nombre de lignes (items_count), le sous-total
+        calculé en SQL (items_subtotal) et ses `preview` premiers articles avec leur
+        produit (preview_items), récupérés pour toute la page en une seule requête
+        (Prefetch découpé : fenêtre ROW_NUMBER par commande).
+        """
+        preview_items = OrderItem.objects.select_related('product').order_by('order_id', 'pk')[:preview]
+        return self.with_subtotal().select_related('promo_code').annotate(
+            items_count=Count('items'),
+        ).prefetch_related(models.Prefetch('items', queryset=preview_items, to_attr='preview_items'))
+
+    def with_subtotal(self):
+        """ Ajoute le sous-total des articles (items_subtotal), calculé en SQL. """
+        return self.annotate(items_subtotal=Coalesce(
+            Sum(F('items__price') * F('items__quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+
 class Order(models.Model):
     class StatusChoices(models.TextChoices):
         PENDING = 'pending', _('En attente')
@@ -442,16 +540,28 @@ class Order(models.Model):
 
     # Informations sur la commande
     created_at = models.DateTimeField(_("Créé le"), auto_now_add=True, db_index=True)
-    updated_at = models.DateTimeField(_("Mis à jour le"), auto_now=True)
+    updated_at = models.DateTimeField(_("Mis à jour le"), auto_now=True, db_index=True)
     status = models.CharField(
         _("Statut"), max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING, db_index=True
     )
     total_paid = models.DecimalField(_("Total payé"), max_digits=10, decimal_places=2, default=0.00)
 
+    # Montants figés à la validation (voir freeze_amounts) ; vides pour les commandes
+    # antérieures tant que la commande backfill_order_amounts n'est pas passée
+    subtotal = models.DecimalField(_("Sous-total"), max_digits=10, decimal_places=2, null=True, blank=True)
+    tax = models.DecimalField(_("TVA"), max_digits=10, decimal_places=2, null=True, blank=True)
+    discount = models.DecimalField(_("Réduction"), max_digits=10, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(_("Total TTC"), max_digits=10, decimal_places=2, null=True, blank=True)
+
     # Pour le suivi du paiement (par ex. avec Stripe ou autre)
     paid = models.BooleanField(_("Payé"), default=False, db_index=True)
     transaction_id = models.CharField(_("ID de transaction"), max_length=100, blank=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    # Statut tel que chargé depuis la base (None pour une commande non enregistrée)
+    _loaded_status = None
+
     class Meta:
         verbose_name = _("Commande")
         verbose_name_plural = _("Commandes")
@@ -460,21 +570,79 @@ class Order(models.Model):
     def __str__(self):
         return f"{_('Commande')} {self.id} {_('par')} {self.first_name} {self.last_name} - {self.get_status_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Photographie du statut au chargement : pas de SELECT supplémentaire avant save()
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get('fields', args[1] if len(args) > 1 else None)
+        # Statut relu en base : la photographie suit, sinon save() comparerait à une valeur périmée
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.__dict__.get('status')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        status_saved = update_fields is None or 'status' in update_fields
+        previous_status = self._loaded_status
+        super().save(*args, **kwargs)
+        if not status_saved:
+            return
+        self._loaded_status = self.status
+        if previous_status is not None and previous_status != self.status:
+            order_status_changed.send(sender=Order, order=self, previous_status=previous_status)
+
+    def freeze_amounts(self, subtotal, discount_percentage=0):
+        """
+        Fige les montants de la commande à partir du sous-total de ses articles :
+        ils ne dépendent plus ensuite ni des lignes ni du code promo (modifiable).
+        """
+        cents = Decimal('0.01')
+        self.subtotal = Decimal(subtotal).quantize(cents)
+        self.tax = (self.subtotal * settings.TAX_RATE).quantize(cents)
+        self.discount = (self.subtotal * Decimal(discount_percentage) / Decimal('100')).quantize(cents)
+        self.total = self.subtotal + self.tax
+        return self
+
     def get_subtotal(self):
-        return sum(item.get_cost() for item in self.items.all())
+        # Montant figé, sinon sous-total annoté par OrderQuerySet.with_summary,
+        # sinon calculé à partir des articles (préchargés ou non)
+        if self.subtotal is not None:
+            return self.subtotal
+        if 'items_subtotal' in self.__dict__:
+            return self.items_subtotal
+        return sum((item.get_cost() for item in self.items.all()), Decimal('0'))
 
     def get_tax(self):
+        if self.tax is not None:
+            return self.tax
         return self.get_subtotal() * settings.TAX_RATE  # Exemple TVA 20%
 
     def get_total(self):
-        return self.get_subtotal() + self.get_tax()
+        if self.total is not None:
+            return self.total
+        subtotal = self.get_subtotal()
+        return subtotal + subtotal * settings.TAX_RATE
 
     def get_discount_amount(self):
         """ Calcule le montant de la réduction si un code promo a été utilisé. """
-        if self.promo_code:
+        if self.discount is not None:
+            return self.discount
+        if self.promo_code_id and self.promo_code:
             return self.get_subtotal() * (Decimal(self.promo_code.discount_percentage) / Decimal("100"))
         return Decimal("0")
 
+    def get_discount_percentage(self):
+        """ Pourcentage appliqué, retrouvé à partir des montants figés. """
+        if self.discount is None:
+            return self.promo_code.discount_percentage if self.promo_code_id and self.promo_code else 0
+        if not self.subtotal:
+            return 0
+        return round(self.discount * 100 / self.subtotal)
+
 # Gestion des articles commandee.
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -498,6 +666,60 @@ class OrderItem(models.Model):
     def get_cost(self):
         return self.price * self.quantity
 
+# Gestion des ventes agrégées (calcul des meilleures ventes)
+class ProductSalesDay(models.Model):
+    """ Ventes payées d'un produit pour une journée, recalculées par store.bestsellers. """
+    product = models.ForeignKey(
+        Product, related_name='sales_days', on_delete=models.CASCADE, verbose_name=_("Produit")
+    )
+    day = models.DateField(_("Jour"), db_index=True)
+    units = models.PositiveIntegerField(_("Unités vendues"), default=0)
+    revenue = models.DecimalField(_("Chiffre d'affaires"), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("Ventes journalières")
+        verbose_name_plural = _("Ventes journalières")
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_sales_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.day} : {self.units}"
+
+class BestSellerRanking(models.Model):
+    """ Classement matérialisé des meilleures ventes sur une fenêtre glissante. """
+    window_days = models.PositiveSmallIntegerField(_("Fenêtre (jours)"))
+    rank = models.PositiveSmallIntegerField(_("Rang"))
+    product = models.ForeignKey(
+        Product, related_name='bestseller_rankings', on_delete=models.CASCADE, verbose_name=_("Produit")
+    )
+    units = models.PositiveIntegerField(_("Unités vendues"), default=0)
+    revenue = models.DecimalField(_("Chiffre d'affaires"), max_digits=12, decimal_places=2, default=0)
+    computed_at = models.DateTimeField(_("Calculé le"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Classement des ventes")
+        verbose_name_plural = _("Classements des ventes")
+        ordering = ['window_days', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window_days', 'rank'], name='unique_bestseller_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.window_days}j #{self.rank} - {self.product_id}"
+
+class AggregationWatermark(models.Model):
+    """ Date de la dernière donnée prise en compte par un calcul incrémental. """
+    name = models.CharField(_("Nom"), max_length=50, unique=True)
+    value = models.DateTimeField(_("Valeur"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Point de reprise")
+        verbose_name_plural = _("Points de reprise")
+
+    def __str__(self):
+        return f"{self.name} : {self.value}"
+
 # Gestion des Likes
 class ProductLike(models.Model):
     product = models.ForeignKey(
@@ -598,3 +820,36 @@ class LegalContent(models.Model):
     def __str__(self):
         return self.title
 
+
+# Gestion de la file d'envoi des e-mails
+class OutgoingEmail(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = 'pending', _('En attente')
+        SENT = 'sent', _('Envoyé')
+        FAILED = 'failed', _('Échec définitif')
+        CANCELED = 'canceled', _('Annulé')
+
+    # Fonction qui construit le message au moment de l'envoi (ex. store.emails.build_order_notification)
+    builder = models.CharField(_("Constructeur"), max_length=200)
+    payload = models.JSONField(_("Paramètres"), default=dict, blank=True)
+    # Clé d'unicité : un même événement ne produit qu'un seul e-mail
+    dedup_key = models.CharField(_("Clé de déduplication"), max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(
+        _("Statut"), max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(_("Tentatives"), default=0)
+    next_attempt_at = models.DateTimeField(_("Prochaine tentative"), default=timezone.now)
+    last_error = models.TextField(_("Dernière erreur"), blank=True)
+    created_at = models.DateTimeField(_("Créé le"), auto_now_add=True)
+    sent_at = models.DateTimeField(_("Envoyé le"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("E-mail en file d'attente")
+        verbose_name_plural = _("E-mails en file d'attente")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.builder} ({self.get_status_display()})"
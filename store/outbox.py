@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutgoingEmail
+
+# Nombre maximal de tentatives avant l'abandon d'un e-mail
+MAX_ATTEMPTS = getattr(settings, 'STORE_EMAIL_MAX_ATTEMPTS', 5)
+# Délai avant la première nouvelle tentative, doublé à chaque échec
+RETRY_BACKOFF = timedelta(seconds=getattr(settings, 'STORE_EMAIL_RETRY_BACKOFF', 60))
+# Durée pendant laquelle un lot réservé n'est pas repris par un autre processus
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+# Gestion de la mise en file
+def enqueue_email(builder, payload=None, dedup_key=None):
+    """
+    Ajoute un e-mail à la file d'envoi, sans contacter le serveur SMTP.
+    L'insertion fait partie de la transaction en cours : si elle est annulée,
+    l'e-mail l'est aussi. `builder` est le chemin d'une fonction qui, appelée
+    avec `payload`, retourne l'EmailMessage à envoyer (ou None s'il n'a plus lieu d'être).
+    Avec une clé de déduplication, un second appel ne crée pas de doublon.
+    """
+    values = {'builder': builder, 'payload': payload or {}}
+    if dedup_key is None:
+        return OutgoingEmail.objects.create(**values)
+    email, _ = OutgoingEmail.objects.get_or_create(dedup_key=dedup_key, defaults=values)
+    return email
+
+
+def _claim_batch(batch_size):
+    """
+    Réserve un lot d'e-mails dus en repoussant leur prochaine tentative.
+    Les lignes sont verrouillées le temps de la réservation seulement (SKIP LOCKED :
+    deux processus d'envoi se partagent la file sans s'attendre), jamais pendant l'envoi SMTP.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.StatusChoices.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(id__in=[email.id for email in batch]).update(next_attempt_at=now + CLAIM_LEASE)
+    return batch
+
+
+def _record_failure(email, error, now, stats):
+    """ Compte la tentative : nouvel essai avec un délai croissant, ou abandon après MAX_ATTEMPTS. """
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutgoingEmail.StatusChoices.FAILED
+        stats['failed'] += 1
+    else:
+        email.next_attempt_at = now + RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        stats['retried'] += 1
+    print(f"Échec de l'envoi de l'e-mail {email.id} (tentative {email.attempts}) : {error}")
+
+
+# Gestion de l'envoi
+def deliver_pending(batch_size=50):
+    """
+    Envoie un lot d'e-mails dus sur une seule connexion SMTP ouverte une fois.
+    Un échec n'interrompt pas le lot : l'e-mail est reprogrammé avec un délai
+    croissant, puis abandonné après MAX_ATTEMPTS tentatives. Si la connexion ne
+    s'ouvre pas, la tentative est comptée pour tout le lot (pas de réservation
+    laissée en place jusqu'à la fin de CLAIM_LEASE).
+    Retourne le nombre d'e-mails envoyés, reprogrammés, abandonnés et annulés.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'canceled': 0}
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return stats
+
+    fields = ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        now = timezone.now()
+        for email in batch:
+            _record_failure(email, e, now, stats)
+        OutgoingEmail.objects.bulk_update(batch, fields)
+        return stats
+    try:
+        for email in batch:
+            now = timezone.now()
+            try:
+                message = import_string(email.builder)(**email.payload)
+                if message is None:
+                    email.status = OutgoingEmail.StatusChoices.CANCELED
+                    stats['canceled'] += 1
+                    continue
+                message.connection = connection
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(email, e, now, stats)
+            else:
+                email.status = OutgoingEmail.StatusChoices.SENT
+                email.attempts += 1
+                email.sent_at = now
+                stats['sent'] += 1
+    finally:
+        connection.close()
+        OutgoingEmail.objects.bulk_update(batch, fields)
+    return stats
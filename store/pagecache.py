@@ -0,0 +1,89 @@
+import hashlib
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.translation import get_language
+
+from .cache import get_version
+
+# Durée de vie des pages en cache (0 désactive le cache des pages)
+PAGE_CACHE_TIMEOUT = getattr(settings, 'STORE_PAGE_CACHE_TIMEOUT', 60 * 10)
+# Espaces versionnés dont dépend le rendu d'une page (produits, menu, bandeaux...)
+PAGE_NAMESPACES = ('pages', 'chrome', 'categories')
+# Le jeton CSRF est propre à chaque visiteur : il est vidé dans la page partagée
+# et renseigné par le JavaScript à partir de api/session-data/
+CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def is_page_shell(request):
+    """ Vrai pendant le rendu d'une page partagée : aucune donnée propre au visiteur. """
+    return getattr(request, 'page_shell', False)
+
+
+def _page_key(request):
+    versions = '.'.join(str(get_version(namespace)) for namespace in PAGE_NAMESPACES)
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.GET.items()))
+    ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    raw = f"{request.path}?{query}|{get_language()}|{int(ajax)}"
+    return f"store:page:{versions}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def _response(request, entry):
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    if entry['last_modified']:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, public=True, max_age=0, s_maxage=PAGE_CACHE_TIMEOUT)
+    # Un visiteur avec cookie (session, connexion) ne reçoit jamais la page d'un autre
+    patch_vary_headers(response, ('Cookie', 'X-Requested-With'))
+    return response
+
+
+# Gestion du cache des pages publiques ("coquille" commune, trous remplis par JavaScript)
+def cache_shell(view):
+    """
+    Met en cache la page rendue pour un visiteur anonyme, sans aucune donnée
+    personnelle : panier, likes, messages et jeton CSRF sont complétés par le
+    JavaScript de base.html via api/session-data/. La clé reprend le chemin, les
+    paramètres (filtres, curseur), la langue et les versions des espaces
+    'pages' (produits, images, avis), 'chrome' et 'categories'.
+    Les réponses portent ETag, Cache-Control public et Vary: Cookie, pour
+    qu'un proxy inverse puisse aussi les servir aux visiteurs sans cookie.
+    Les utilisateurs connectés et les requêtes autres que GET/HEAD passent tout droit.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not PAGE_CACHE_TIMEOUT or request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            request.page_shell = True
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            if hasattr(response, 'render'):
+                response.render()
+            # La page partagée ne doit pas déposer le cookie CSRF du visiteur qui l'a rendue
+            request.META['CSRF_COOKIE_NEEDS_UPDATE'] = False
+            content = CSRF_INPUT.sub(r'\1\2', response.content.decode(response.charset))
+            # Validateurs posés par la vue (voir store.freshness), sinon condensat du contenu
+            entry = {
+                'content': content,
+                'content_type': response['Content-Type'],
+                'etag': response.get('ETag') or f'"{hashlib.md5(content.encode()).hexdigest()}"',
+                'last_modified': parse_http_date_safe(response.get('Last-Modified', '')),
+            }
+            cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+        return _response(request, entry)
+
+    return wrapper
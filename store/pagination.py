@@ -0,0 +1,114 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """ Le curseur fourni par le client est illisible ou altéré. """
+
+
+class CursorPage:
+    """
+    Une page de résultats obtenue par pagination par curseur (keyset).
+    Expose la même interface minimale que django.core.paginator.Page.
+    """
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Pagination par curseur : au lieu d'un OFFSET et d'un COUNT(*), chaque page
+    reprend après la dernière ligne vue grâce à un filtre sur les colonnes de
+    tri (ex. add_date, id). Le coût d'une page ne dépend pas de sa profondeur.
+
+    L'ordre est celui du queryset (ou du Meta.ordering du modèle), complété par
+    la clé primaire pour départager les égalités. Les champs de tri doivent
+    être des colonnes ou des annotations non nulles.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = self._resolve_ordering(ordering)
+
+    def _resolve_ordering(self, ordering):
+        model = self.queryset.model
+        ordering = list(ordering or self.queryset.query.order_by or model._meta.ordering)
+        pk_name = model._meta.pk.name
+        if not any(field.lstrip('-') in (pk_name, 'pk') for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    @staticmethod
+    def _serialize(value):
+        # isoformat() complet : DjangoJSONEncoder tronque les microsecondes,
+        # ce qui ferait sauter des lignes à la frontière de deux pages
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotation (ex. rang de recherche) : valeur JSON brute
+            return value
+        return field.to_python(value)
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name, _ in self.ordering]
+        raw = json.dumps(values, default=self._serialize, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [self._to_python(name, value) for (name, _), value in zip(self.ordering, values)]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _after(self, values):
+        """
+        Construit la condition "strictement après" sur le tuple de tri :
+        (a < va) OR (a = va AND b < vb) OR ...
+        """
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(
+            *[f"-{name}" if descending else name for name, descending in self.ordering]
+        )
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+
+        # Une ligne de plus que la page permet de savoir s'il y a une suite sans COUNT(*)
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return CursorPage(rows, next_cursor)
@@ -0,0 +1,294 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .checkout import cancel_order, reinstate_order
+from .models import Order
+
+
+class PaymentError(Exception):
+    """ Le paiement n'a pas pu être initialisé ou vérifié. """
+
+
+class PaymentUnavailable(PaymentError):
+    """ Le service de paiement ne répond pas (réseau, délai dépassé, erreur 5xx). """
+
+    def __init__(self, message, code='network'):
+        self.code = code
+        super().__init__(message)
+
+
+class PaymentRefused(PaymentError):
+    """ Le service de paiement a répondu mais refuse la transaction. """
+
+    def __init__(self, code, message=''):
+        self.code = code
+        super().__init__(f"{code} {message}".strip())
+
+
+# Gestion des mesures (latence et codes de réponse)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PaymentMetrics:
+    """
+    Mesures du processus courant, par opération ('initialize', 'check') :
+    histogramme cumulatif des latences (ms) et nombre d'appels par code de réponse
+    ('201', '00', '627'... ou 'http_503', 'timeout', 'network').
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+            self._sum_ms = defaultdict(float)
+            self._codes = defaultdict(Counter)
+
+    def observe(self, operation, code, elapsed_ms):
+        with self._lock:
+            buckets = self._buckets[operation]
+            buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            self._sum_ms[operation] += elapsed_ms
+            self._codes[operation][str(code)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            latency = {}
+            for operation, buckets in self._buckets.items():
+                cumulative, histogram = 0, {}
+                for bound, count in zip(LATENCY_BUCKETS_MS + ('+Inf',), buckets):
+                    cumulative += count
+                    histogram[f"le_{bound}"] = cumulative
+                latency[operation] = {
+                    'buckets': histogram, 'count': cumulative, 'sum_ms': round(self._sum_ms[operation], 1),
+                }
+            return {'latency_ms': latency, 'codes': {op: dict(codes) for op, codes in self._codes.items()}}
+
+
+metrics = PaymentMetrics()
+
+
+class BaseGateway:
+    """ Chronomètre chaque appel et l'enregistre dans `metrics` avec son code de réponse. """
+
+    def _observe(self, operation, call):
+        started = time.perf_counter()
+        code = 'error'
+        try:
+            result = call()
+            code = result.get('code') if isinstance(result, dict) else '201'
+            return result
+        except PaymentError as exc:
+            code = exc.code
+            raise
+        finally:
+            metrics.observe(operation, code, (time.perf_counter() - started) * 1000)
+
+    def initialize(self, payment):
+        """ Crée la transaction et retourne l'URL de la page de paiement. """
+        return self._observe('initialize', lambda: self._initialize(payment))
+
+    def check(self, transaction_id):
+        """ Retourne la réponse brute de vérification ('code' vaut '00' si la transaction est payée). """
+        return self._observe('check', lambda: self._check(transaction_id))
+
+    def close(self):
+        pass
+
+
+# Gestion de l'API CinetPay
+class CinetPayGateway(BaseGateway):
+    """
+    Client de l'API de paiement CinetPay, construit une fois par processus
+    (voir get_payment_gateway) : une seule session HTTP avec connexions
+    persistantes, donc sans nouvelle poignée de main TLS à chaque paiement.
+    L'initialisation d'un paiement n'est pas idempotente : elle n'est retentée
+    que si la requête n'a pas pu être envoyée (connexion impossible) ou a été
+    refusée par le service (503). Un 502/504 venant d'un proxy ne dit pas si
+    CinetPay a traité la requête. La vérification d'une transaction, sans effet
+    de bord, est aussi retentée sur 502/504 et après un délai de lecture dépassé.
+    """
+    base_url = 'https://api-checkout.cinetpay.com/v2'
+    retry_statuses = (503,)
+    idempotent_retry_statuses = (502, 503, 504)
+
+    def __init__(self, api_key=None, site_id=None, timeout=None, retries=None, backoff=0.5, transport=None):
+        self.api_key = api_key or settings.CINETPAY_API_KEY
+        self.site_id = site_id or settings.CINETPAY_SITE_ID
+        connect, read = timeout or getattr(settings, 'STORE_PAYMENT_TIMEOUT', (5, 15))
+        self.retries = getattr(settings, 'STORE_PAYMENT_RETRIES', 2) if retries is None else retries
+        self.backoff = backoff
+        # `transport` permet de brancher un faux serveur (httpx.MockTransport) dans les tests
+        self.client = httpx.Client(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read, connect=connect, pool=connect),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'STORE_PAYMENT_MAX_CONNECTIONS', 10),
+                max_keepalive_connections=getattr(settings, 'STORE_PAYMENT_MAX_CONNECTIONS', 10),
+                keepalive_expiry=60,
+            ),
+            transport=transport,
+        )
+
+    def close(self):
+        self.client.close()
+
+    def _post(self, path, payload, idempotent=False):
+        retryable = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        retry_statuses = self.retry_statuses
+        if idempotent:
+            retryable += (httpx.ReadTimeout,)
+            retry_statuses = self.idempotent_retry_statuses
+        payload = {'apikey': self.api_key, 'site_id': self.site_id, **payload}
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self.client.post(path, json=payload)
+            except retryable as exc:
+                if last_attempt:
+                    code = 'timeout' if isinstance(exc, httpx.TimeoutException) else 'network'
+                    raise PaymentUnavailable(str(exc), code=code) from exc
+            except httpx.TimeoutException as exc:
+                raise PaymentUnavailable(str(exc), code='timeout') from exc
+            except httpx.HTTPError as exc:
+                raise PaymentUnavailable(str(exc)) from exc
+            else:
+                if response.status_code not in retry_statuses:
+                    try:
+                        return response.json()
+                    except ValueError as exc:
+                        raise PaymentUnavailable(
+                            f"Réponse illisible ({response.status_code})", code=f"http_{response.status_code}"
+                        ) from exc
+                if last_attempt:
+                    raise PaymentUnavailable(f"HTTP {response.status_code}", code=f"http_{response.status_code}")
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def _initialize(self, payment):
+        data = self._post('/payment', {'currency': 'XOF', 'channels': 'ALL', 'lang': 'fr', **payment})
+        if data.get('code') != '201':
+            raise PaymentRefused(data.get('code'), data.get('message', ''))
+        return data['data']['payment_url']
+
+    def _check(self, transaction_id):
+        return self._post('/payment/check', {'transaction_id': transaction_id}, idempotent=True)
+
+
+# Gestion du simulateur de paiement (développement et tests hors ligne)
+class StubGateway(BaseGateway):
+    """
+    Remplace CinetPay sans réseau. La page de paiement simulée (vue payment_stub)
+    confirme la transaction puis renvoie vers payment_return, comme le vrai service.
+    STORE_PAYMENT_STUB_OUTCOME : 'accept', 'refuse' (paiement refusé à la vérification),
+    'decline' (initialisation refusée) ou 'error' (service injoignable) ;
+    STORE_PAYMENT_STUB_LATENCY simule la durée d'un appel, en secondes.
+    """
+
+    def __init__(self, outcome=None, latency=None):
+        self.outcome = outcome or getattr(settings, 'STORE_PAYMENT_STUB_OUTCOME', 'accept')
+        self.latency = getattr(settings, 'STORE_PAYMENT_STUB_LATENCY', 0) if latency is None else latency
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.outcome == 'error':
+            raise PaymentUnavailable("Service de paiement simulé indisponible")
+
+    def _initialize(self, payment):
+        self._call()
+        if self.outcome == 'decline':
+            raise PaymentRefused('608', 'MINIMUM_REQUIRED_FIELDS')
+        return settings.SITE_URL + reverse('payment_stub', args=[payment['transaction_id']])
+
+    def _check(self, transaction_id):
+        self._call()
+        if self.outcome == 'refuse':
+            return {'code': '627', 'message': 'TRANSACTION_CANCEL'}
+        return {'code': '00', 'message': 'SUCCES'}
+
+
+# Gestion de la passerelle partagée par le processus
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_payment_gateway():
+    """ Passerelle unique du processus, construite au premier appel depuis STORE_PAYMENT_BACKEND. """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(getattr(settings, 'STORE_PAYMENT_BACKEND', 'store.payments.CinetPayGateway'))()
+    return _gateway
+
+
+def set_payment_gateway(gateway):
+    """
+    Remplace la passerelle du processus (ex. un faux dans les tests).
+    Avec None, la prochaine utilisation reconstruit celle de STORE_PAYMENT_BACKEND.
+    """
+    global _gateway
+    with _gateway_lock:
+        previous, _gateway = _gateway, gateway
+    if previous is not None and previous is not gateway:
+        previous.close()
+
+
+# Gestion du cycle de paiement d'une commande
+def initialize_order_payment(order, description):
+    """
+    Deuxième phase de la commande : appelée APRÈS la validation de la transaction
+    qui a enregistré la commande, pour ne tenir aucun verrou pendant l'appel réseau.
+    """
+    return get_payment_gateway().initialize({
+        'amount': int(order.total_paid),
+        'transaction_id': order.transaction_id,
+        'description': description,
+        'return_url': settings.SITE_URL + reverse('payment_return'),
+        'notify_url': settings.SITE_URL + reverse('cinetpay_notify'),
+        'customer_name': f"{order.first_name} {order.last_name}",
+        'customer_surname': order.last_name,
+        'customer_email': order.email,
+        'customer_phone_number': order.phone,
+    })
+
+
+def confirm_payment(transaction_id):
+    """
+    Vérifie une transaction auprès du service de paiement et met la commande à jour :
+    payée et en traitement, ou annulée avec remise en stock. Retourne True si payée.
+    Un paiement confirmé après l'annulation (stock déjà rendu) reprend le stock ; s'il
+    n'y en a plus assez, la commande reste annulée mais marquée payée : à rembourser.
+    Lève Order.DoesNotExist ou PaymentUnavailable.
+    """
+    order = Order.objects.get(transaction_id=transaction_id)
+    response = get_payment_gateway().check(transaction_id)
+
+    if response.get('code') != '00':
+        cancel_order(order.id)
+        return False
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        canceled = order.status == Order.StatusChoices.CANCELED
+        if order.paid:
+            return not canceled
+        order.paid = True
+        if canceled and not reinstate_order(order):
+            print(f"Commande {order.id} payée après son annulation, stock insuffisant : à rembourser")
+            order.save(update_fields=['paid', 'updated_at'])
+            return False
+        order.status = Order.StatusChoices.PROCESSING
+        order.save(update_fields=['paid', 'status', 'updated_at'])
+    return True
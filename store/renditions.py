@@ -0,0 +1,118 @@
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+# Largeurs générées pour chaque image (srcset) et proportion des visuels produit (1280x813)
+RENDITION_WIDTHS = tuple(getattr(settings, 'STORE_RENDITION_WIDTHS', (320, 640, 1280)))
+RENDITION_RATIO = 813 / 1280
+RENDITION_QUALITY = {'avif': 60, 'webp': 80, 'jpeg': 85}
+# Formats du plus léger au plus compatible ; le JPEG sert de repli (<img src>)
+RENDITION_FORMATS = tuple(
+    fmt for fmt in ('avif', 'webp', 'jpeg') if fmt == 'jpeg' or features.check(fmt)
+)
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+RENDITION_ROOT = 'renditions'
+# Valeur du condensat d'une image dont la génération a échoué : plus retentée sans --all
+RENDITION_FAILED = '-'
+# Taille de la réserve de processus pour l'encodage (Pillow est lié au CPU)
+RENDITION_WORKERS = getattr(settings, 'STORE_RENDITION_WORKERS', None)
+
+
+def rendition_name(digest, width, fmt):
+    """ Nom de stockage : le condensat du fichier source rend le nom stable et partagé. """
+    return f"{RENDITION_ROOT}/{digest[:2]}/{digest}/{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def source_digest(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def render_variants(data):
+    """
+    Encode toutes les variantes d'une image source (octets -> {(largeur, format): octets}).
+    Fonction pure, sans Django : elle s'exécute dans les processus de la réserve.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        variants = {}
+        for width in RENDITION_WIDTHS:
+            image = ImageOps.fit(source.convert('RGB'), (width, round(width * RENDITION_RATIO)), Image.LANCZOS)
+            for fmt in RENDITION_FORMATS:
+                buffer = io.BytesIO()
+                image.save(buffer, format=fmt.upper(), quality=RENDITION_QUALITY[fmt])
+                variants[(width, fmt)] = buffer.getvalue()
+        return variants
+
+
+def _store_variants(digest, variants, storage):
+    for (width, fmt), content in variants.items():
+        name = rendition_name(digest, width, fmt)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(content))
+
+
+def _missing(digest, storage):
+    return any(
+        not storage.exists(rendition_name(digest, width, fmt))
+        for width in RENDITION_WIDTHS for fmt in RENDITION_FORMATS
+    )
+
+
+def _read(field_file):
+    field_file.open('rb')
+    try:
+        return field_file.read()
+    finally:
+        field_file.close()
+
+
+# Gestion de la génération
+def generate_renditions(field_files, storage=default_storage, max_workers=RENDITION_WORKERS):
+    """
+    Génère les variantes des fichiers donnés dans une réserve de processus.
+    Les sources identiques (même contenu) ne sont encodées qu'une fois et les
+    variantes déjà présentes ne sont pas refaites.
+    Retourne {nom du fichier source: condensat}.
+    """
+    digests, pending = {}, {}
+    for field_file in field_files:
+        if not field_file:
+            continue
+        data = _read(field_file)
+        digest = source_digest(data)
+        digests[field_file.name] = digest
+        if digest not in pending and _missing(digest, storage):
+            pending[digest] = data
+
+    if len(pending) == 1:
+        # Une seule image à encoder : pas besoin de démarrer des processus
+        digest, data = pending.popitem()
+        _store_variants(digest, render_variants(data), storage)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for digest, variants in zip(pending, pool.map(render_variants, pending.values())):
+                _store_variants(digest, variants, storage)
+    return digests
+
+
+def delete_renditions(digests, storage=default_storage):
+    """ Supprime les variantes des condensats donnés (sources qui ne sont plus utilisées). """
+    for digest in digests:
+        for width in RENDITION_WIDTHS:
+            for fmt in RENDITION_FORMATS:
+                storage.delete(rendition_name(digest, width, fmt))
+
+
+# Gestion de l'affichage (aucun travail Pillow : les noms se déduisent du condensat)
+def rendition_url(digest, width, fmt='jpeg', storage=default_storage):
+    return storage.url(rendition_name(digest, width, fmt))
+
+
+def rendition_srcset(digest, fmt='jpeg', storage=default_storage):
+    return ', '.join(f"{rendition_url(digest, width, fmt, storage)} {width}w" for width in RENDITION_WIDTHS)
+
@@ -0,0 +1,251 @@
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Value, When, TextField
+
+from .models import Product
+
+# Configuration PostgreSQL utilisée pour la racinisation
+SEARCH_CONFIG = getattr(settings, 'STORE_SEARCH_CONFIG', 'french')
+
+# Produits dont les vecteurs sont recalculés par une même requête UPDATE
+INDEX_BATCH_SIZE = 500
+
+# Poids des champs : le nom compte plus que la description
+FIELD_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+STOP_WORDS = frozenset({
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en', 'et', 'il', 'la', 'le',
+    'les', 'leur', 'lui', 'ma', 'mais', 'me', 'mes', 'mon', 'ne', 'ni', 'nos', 'notre', 'nous', 'ou',
+    'par', 'pas', 'pour', 'qu', 'que', 'qui', 'sa', 'se', 'ses', 'son', 'sur', 'ta', 'te', 'tes',
+    'ton', 'tu', 'un', 'une', 'vos', 'votre', 'vous',
+})
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    """ Minuscules et suppression des accents ("Été" -> "ete"). """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [word for word in WORD_RE.findall(normalize(text)) if word not in STOP_WORDS]
+
+
+def document_parts(product):
+    """
+    Texte indexé d'un produit, regroupé par poids.
+    Le produit doit être chargé avec sa catégorie et ses caractéristiques.
+    """
+    features = ' '.join(
+        f"{feature.name or ''} {feature.value or ''}" for feature in product.features.all()
+    )
+    return {
+        'A': normalize(product.name),
+        'B': normalize(f"{product.subname or ''} {product.category.name if product.category else ''}"),
+        'C': normalize(f"{product.description or ''} {features}"),
+    }
+
+
+def _indexable_products():
+    return Product.objects.select_related('category').prefetch_related('features')
+
+
+# Gestion de l'index inversé en mémoire (SQLite / développement)
+class InvertedIndex:
+    """
+    Index inversé tenu en mémoire du processus : mot -> {id produit: score}.
+    Construit au premier usage puis mis à jour produit par produit par les signaux.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._vocabulary = []
+        self._dirty = False
+
+    def _add(self, product_id, parts):
+        scores = defaultdict(float)
+        for weight, text in parts.items():
+            for token in tokenize(text):
+                scores[token] += FIELD_WEIGHTS[weight]
+        for token, score in scores.items():
+            self._postings[token][product_id] = score
+        self._documents[product_id] = tuple(scores)
+        self._dirty = True
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._dirty = True
+
+    def rebuild(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for product in _indexable_products().iterator(chunk_size=500):
+                self._add(product.id, document_parts(product))
+            self.loaded = True
+
+    def update(self, product):
+        with self._lock:
+            if not self.loaded:
+                return  # sera indexé lors de la construction complète
+            self._remove(product.id)
+            self._add(product.id, document_parts(product))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _prefix_matches(self, prefix):
+        if self._dirty:
+            self._vocabulary = sorted(self._postings)
+            self._dirty = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        matches = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, query):
+        """
+        Retourne {id produit: score}. Tous les mots doivent correspondre,
+        le dernier est traité comme un préfixe (recherche pendant la frappe).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+        with self._lock:
+            if not self.loaded:
+                self.rebuild()
+            results = None
+            for position, token in enumerate(tokens):
+                candidates = [token]
+                if position == len(tokens) - 1:
+                    candidates = self._prefix_matches(token)
+                scores = defaultdict(float)
+                for candidate in candidates:
+                    for product_id, score in self._postings.get(candidate, {}).items():
+                        scores[product_id] = max(scores[product_id], score)
+                if results is None:
+                    results = dict(scores)
+                else:
+                    results = {pid: results[pid] + scores[pid] for pid in results if pid in scores}
+                if not results:
+                    return {}
+            return results
+
+
+memory_index = InvertedIndex()
+
+
+def uses_postgres(using):
+    return connections[using].vendor == 'postgresql'
+
+
+# Gestion de la mise à jour de l'index
+def _document_vector(parts):
+    return (
+        SearchVector(Value(parts['A'], output_field=TextField()), config=SEARCH_CONFIG, weight='A')
+        + SearchVector(Value(parts['B'], output_field=TextField()), config=SEARCH_CONFIG, weight='B')
+        + SearchVector(Value(parts['C'], output_field=TextField()), config=SEARCH_CONFIG, weight='C')
+    )
+
+
+def index_products(product_ids, using='default', batch_size=INDEX_BATCH_SIZE):
+    """
+    Recalcule le vecteur de recherche (PostgreSQL) ou l'index mémoire des produits donnés.
+    Sous PostgreSQL, un seul UPDATE ... CASE par lot de `batch_size` produits.
+    """
+    postgres = uses_postgres(using)
+    if not postgres and not memory_index.loaded:
+        return  # l'index mémoire sera construit complet au premier usage
+    products = _indexable_products().using(using).filter(id__in=product_ids)
+    if not postgres:
+        for product in products:
+            memory_index.update(product)
+        return
+    vectors = [(product.id, _document_vector(document_parts(product))) for product in products]
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        Product.objects.using(using).filter(id__in=[pid for pid, _ in batch]).update(
+            search_vector=Case(*[When(id=pid, then=vector) for pid, vector in batch])
+        )
+
+
+_pending = threading.local()
+
+
+def _flush_pending(using):
+    ids = getattr(_pending, 'ids', None)
+    _pending.ids = set()
+    if ids:
+        index_products(ids, using=using)
+
+
+def schedule_reindex(product_id, using='default'):
+    """
+    Programme la réindexation d'un produit à la fin de la transaction.
+    Les appels multiples (produit + caractéristiques en ligne dans l'admin)
+    sont regroupés : le premier rappel réindexe tout, les suivants n'ont rien à faire.
+    """
+    if getattr(_pending, 'ids', None) is None:
+        _pending.ids = set()
+    _pending.ids.add(product_id)
+    transaction.on_commit(lambda: _flush_pending(using), using=using)
+
+
+def unindex_product(product_id, using='default'):
+    if not uses_postgres(using):
+        memory_index.remove(product_id)
+
+
+# Gestion de la recherche
+def search_products(queryset, query):
+    """
+    Filtre un queryset de produits par pertinence.
+    Le résultat est annoté par `search_rank` et trié par rang décroissant,
+    ce qui le rend compatible avec la pagination par curseur.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    if uses_postgres(queryset.db):
+        # Le dernier mot est un préfixe ; les mots sont déjà nettoyés par la regex
+        raw = ' & '.join(tokens[:-1] + [f"{tokens[-1]}:*"])
+        search_query = SearchQuery(raw, config=SEARCH_CONFIG, search_type='raw')
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(search_rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-search_rank')
+        )
+
+    scores = memory_index.search(query)
+    if not scores:
+        return queryset.none()
+    return (
+        queryset.filter(id__in=scores)
+        .annotate(search_rank=Case(
+            *[When(id=product_id, then=Value(score)) for product_id, score in scores.items()],
+            output_field=FloatField(),
+        ))
+        .order_by('-search_rank')
+    )
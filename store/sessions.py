@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+# Délai (s) pendant lequel une session modifiée n'est écrite que dans le cache
+PERSIST_INTERVAL = getattr(settings, 'STORE_SESSION_PERSIST_INTERVAL', 5 * 60)
+
+
+# Gestion des sessions en cache avec écriture différée en base
+class SessionStore(CachedDBStore):
+    """
+    Moteur de session (SESSION_ENGINE = 'store.sessions') : les lectures se font
+    dans le cache comme avec cached_db, mais une session modifiée n'est recopiée
+    en base qu'au plus une fois toutes les PERSIST_INTERVAL secondes (messages,
+    order_id... ne coûtent plus un UPDATE chacun). La création, la connexion et
+    la déconnexion (changement de clé) passent toujours par la base.
+    Si l'entrée est évincée du cache entre deux recopies, les dernières
+    modifications sont perdues : le cache doit être partagé et assez grand.
+    """
+    cache_key_prefix = 'store.sessions.'
+
+    def _persisted_key(self, session_key=None):
+        return f"{self.cache_key_prefix}{session_key or self.session_key}:persisted"
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        now = time.time()
+        persisted_at = None if must_create else self._cache.get(self._persisted_key())
+        if persisted_at is None or now - persisted_at >= PERSIST_INTERVAL:
+            try:
+                DBStore.save(self, must_create)
+            except UpdateError:
+                # La ligne a été purgée entre deux recopies alors que la session vit dans le cache
+                DBStore.save(self, must_create=True)
+            self._cache.set(self._persisted_key(), now, self.get_expiry_age())
+        self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        if session_key is None and self.session_key is None:
+            return
+        self._cache.delete(self._persisted_key(session_key))
+        super().delete(session_key)
@@ -1,10 +1,19 @@
+import threading
+
 from django.contrib.auth.signals import user_logged_in
 from django.db import transaction
 from django.dispatch import receiver
+from mptt.signals import node_moved
 from store.models import Cart, CartItem
-from django.db.models.signals import pre_save, post_save
-from .models import Order
+from django.db.models.signals import pre_save, post_save, post_delete
+from .cache import bump_version, bump_version_on_commit
+from .models import Order, Category, Promotion, Banner, BestSeller, Toast, Blog, Cta, LegalContent, Product, \
+    ProductFeature, ProductLike, ReviewRating, OrderItem, ProductImage, order_status_changed
+from .counters import adjust_counters, rebuild_counters, touch_product
+from .likes import forget_liked_products
+from .search import schedule_reindex, unindex_product
 from .emails import send_order_notification
+from .renditions import RENDITION_FAILED, delete_renditions
 
 
 
@@ -47,25 +56,185 @@ def merge_cart_on_login(sender, request, user, **kwargs):
     guest_cart.delete()
     print("Fusion terminée. Panier invité supprimé.")  # Ligne de débogage
 
-@receiver(pre_save, sender=Order)
-def store_previous_status(sender, instance, **kwargs):
+@receiver(order_status_changed)
+def notify_on_status_change(sender, order, previous_status, **kwargs):
+    """
+    Quand le statut d'une commande change (save() ou mise à jour groupée),
+    on met en file un e-mail de notification.
+    """
+    print(
+        f"Statut de la commande {order.id} changé de '{previous_status}' à '{order.status}'. Envoi de la notification...")
+    send_order_notification(order.id, is_new_order=False, status=order.status, changed_at=order.updated_at)
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=BestSeller)
+@receiver(post_delete, sender=BestSeller)
+@receiver(post_save, sender=Toast)
+@receiver(post_delete, sender=Toast)
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+@receiver(post_save, sender=Cta)
+@receiver(post_delete, sender=Cta)
+@receiver(post_save, sender=LegalContent)
+@receiver(post_delete, sender=LegalContent)
+def invalidate_site_chrome(sender, **kwargs):
+    """
+    Invalide les fragments communs (menu, bandeaux, blogs...) mis en cache
+    par le context processor dès qu'un des modèles affichés change.
+    """
+    bump_version_on_commit('chrome')
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductFeature)
+@receiver(post_delete, sender=ProductFeature)
+@receiver(post_save, sender=ReviewRating)
+@receiver(post_delete, sender=ReviewRating)
+def invalidate_public_pages(sender, **kwargs):
+    """ Invalide les pages publiques en cache (voir store.pagecache). """
+    bump_version_on_commit('pages')
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductFeature)
+@receiver(post_delete, sender=ProductFeature)
+@receiver(post_save, sender=ReviewRating)
+@receiver(post_delete, sender=ReviewRating)
+def touch_parent_product(sender, instance, **kwargs):
+    """ La fiche produit change avec ses images, caractéristiques et avis (Product.updated_at). """
+    touch_product(instance.product_id)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """
+    Invalide l'arbre des catégories en cache (menu et filtre) : création,
+    modification, suppression ou déplacement depuis DraggableMPTTAdmin.
+    """
+    bump_version_on_commit('categories')
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_counts(sender, instance, update_fields=None, **kwargs):
+    """ Le nombre de produits par catégorie ne change qu'avec la catégorie d'un produit. """
+    if update_fields and 'category' not in update_fields:
+        return
+    bump_version_on_commit('categories')
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, update_fields=None, **kwargs):
+    """
+    Met à jour l'index de recherche quand un produit est créé ou modifié.
+    Les sauvegardes partielles (stock, compteurs...) ne touchent pas au texte indexé.
+    """
+    if update_fields and not {'name', 'subname', 'description', 'category'} & set(update_fields):
+        return
+    schedule_reindex(instance.pk)
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+@receiver(post_save, sender=ProductFeature)
+@receiver(post_delete, sender=ProductFeature)
+def reindex_product_features(sender, instance, **kwargs):
+    if instance.product_id:
+        schedule_reindex(instance.product_id)
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """ Le nom de la catégorie fait partie du texte indexé de ses produits. """
+    if not created:
+        for product_id in instance.products.values_list('id', flat=True):
+            schedule_reindex(product_id)
+
+@receiver(post_save, sender=ProductLike)
+def update_likes_count(sender, instance, created, **kwargs):
     """
-    Avant de sauvegarder un objet Order, on stocke son ancien statut
-    pour pouvoir le comparer après la sauvegarde.
+    Maintient Product.likes_count sans recompter la table des likes,
+    ainsi que l'ensemble des likes du visiteur en cache (voir store.likes).
     """
-    if instance.pk:
-        try:
-            instance._old_status = Order.objects.get(pk=instance.pk).status
-        except Order.DoesNotExist:
-            instance._old_status = None
+    if created:
+        adjust_counters(instance.product_id, likes_count=1)
+        forget_liked_products(instance)
+
+@receiver(post_delete, sender=ProductLike)
+def remove_likes_count(sender, instance, **kwargs):
+    adjust_counters(instance.product_id, likes_count=-1)
+    forget_liked_products(instance)
+
+@receiver(post_save, sender=ReviewRating)
+def update_review_counters(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(instance.product_id, reviews_count=1, rating_sum=instance.rating)
+    else:
+        # Note modifiée : on recalcule la somme de ce seul produit
+        rebuild_counters(Product.objects.filter(pk=instance.product_id), fields=['reviews_count', 'rating_sum'])
+
+@receiver(post_delete, sender=ReviewRating)
+def remove_review_counters(sender, instance, **kwargs):
+    adjust_counters(instance.product_id, reviews_count=-1, rating_sum=-instance.rating)
+
+@receiver(post_save, sender=OrderItem)
+def update_units_sold(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(instance.product_id, units_sold=instance.quantity)
+    elif instance.product_id:
+        rebuild_counters(Product.objects.filter(pk=instance.product_id), fields=['units_sold'])
 
-@receiver(post_save, sender=Order)
-def notify_on_status_change(sender, instance, created, **kwargs):
+@receiver(post_delete, sender=OrderItem)
+def remove_units_sold(sender, instance, **kwargs):
+    adjust_counters(instance.product_id, units_sold=-instance.quantity)
+
+# Images dont les variantes sont pré-générées (champ -> champ <nom>_digest)
+RENDITION_FIELDS = {Product: ('thumbnail', 'scroll_image'), ProductImage: ('image',)}
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+def reset_renditions(sender, instance, update_fields=None, **kwargs):
     """
-    Après la sauvegarde, si le statut a changé, on envoie un e-mail de notification.
+    Vide le condensat d'une image envoyée pendant cette sauvegarde ou retirée :
+    l'original est affiché et l'image attend le worker `generate_renditions --loop`
+    (ou un passage planifié de la commande). Aucun encodage pendant la requête.
     """
-    if not created and hasattr(instance, '_old_status') and instance._old_status != instance.status:
-        print(
-            f"Statut de la commande {instance.id} changé de '{instance._old_status}' à '{instance.status}'. Envoi de la notification...")
-        send_order_notification(instance.id, is_new_order=False)
+    for name in RENDITION_FIELDS[sender]:
+        if update_fields is not None and name not in update_fields:
+            continue
+        field_file = getattr(instance, name)
+        if not field_file or not getattr(field_file, '_committed', True):
+            setattr(instance, f"{name}_digest", '')
+
+_orphan_digests = threading.local()
+
 
+def _delete_orphan_renditions():
+    digests = getattr(_orphan_digests, 'digests', None)
+    _orphan_digests.digests = set()
+    if not digests:
+        return
+    # Un même fichier source (même condensat) peut servir à plusieurs produits
+    for model, fields in RENDITION_FIELDS.items():
+        for name in fields:
+            digests -= set(model.objects.filter(**{f"{name}_digest__in": digests}).values_list(f"{name}_digest", flat=True))
+    delete_renditions(digests)
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def cleanup_renditions(sender, instance, **kwargs):
+    """
+    Supprime les variantes d'une image supprimée si aucun autre objet ne les utilise.
+    Les suppressions d'une même transaction (ex. un lot d'import) sont traitées ensemble.
+    """
+    digests = {getattr(instance, f"{name}_digest") for name in RENDITION_FIELDS[sender]} - {'', RENDITION_FAILED}
+    if not digests:
+        return
+    if getattr(_orphan_digests, 'digests', None) is None:
+        _orphan_digests.digests = set()
+    _orphan_digests.digests |= digests
+    transaction.on_commit(_delete_orphan_renditions)
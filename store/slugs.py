@@ -0,0 +1,94 @@
+import re
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Nouvelles tentatives quand un autre enregistrement prend le même slug entre le choix et l'INSERT
+SLUG_ATTEMPTS = 5
+# Place gardée en fin de slug pour le suffixe ("-12")
+SUFFIX_LENGTH = 8
+
+
+def slug_base(text, max_length, fallback='item'):
+    return slugify(text)[:max_length - SUFFIX_LENGTH].strip('-') or fallback
+
+
+def _used_suffixes(taken):
+    """ Suffixes numériques déjà pris, par base ("sandale-3" -> {"sandale": {3}}), en un passage. """
+    used = defaultdict(set)
+    for slug in taken:
+        base, _, suffix = slug.rpartition('-')
+        if base and suffix.isdigit():
+            used[base].add(int(suffix))
+    return used
+
+
+def _free_slugs(base, taken, used):
+    """ base, base-1, base-2... dans l'ordre, sauf ceux de `taken` (complété au fur et à mesure). """
+    if base not in taken:
+        yield base
+    counter = 1
+    while True:
+        slug = f"{base}-{counter}"
+        if counter not in used and slug not in taken:
+            yield slug
+        counter += 1
+
+
+# Gestion de l'attribution des slugs
+def allocate_slugs(model, bases, field='slug', reserved=(), exclude_pk=None):
+    """
+    Slugs libres pour chaque base de `bases` (dans l'ordre, deux bases identiques
+    reçoivent deux slugs différents) : une seule requête lit les slugs existants
+    égaux à l'une des bases ou de la forme base-N (pas tous ceux qui commencent par
+    la base : "t" ou "sac" en ramèneraient une grande partie du catalogue), les
+    suffixes sont choisis en mémoire.
+    `reserved` : slugs déjà pris hors base (ex. autres lignes d'un même import).
+    L'unicité n'est garantie que par la contrainte en base : voir save_with_unique_slug.
+    """
+    if not bases:
+        return []
+    existing = model._default_manager.filter(reduce(or_, (
+        Q(**{field: base}) | Q(**{f"{field}__regex": rf'^{re.escape(base)}-\d+$'}) for base in set(bases)
+    )))
+    if exclude_pk is not None:
+        existing = existing.exclude(pk=exclude_pk)
+    taken = set(existing.order_by().values_list(field, flat=True))
+    taken.update(reserved)
+    used = _used_suffixes(taken)
+    free = {}
+    slugs = []
+    for base in bases:
+        if base not in free:
+            free[base] = _free_slugs(base, taken, used[base])
+        slug = next(free[base])
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def save_with_unique_slug(instance, save, text, field='slug', attempts=SLUG_ATTEMPTS):
+    """
+    Enregistre `instance` (appel de `save`, en général super().save) avec un slug
+    tiré de `text`. Pas de vérification préalable : en cas de collision avec un
+    enregistrement concurrent, la contrainte d'unicité lève IntegrityError et un
+    nouveau slug est choisi.
+    """
+    model = type(instance)
+    base = slug_base(text, model._meta.get_field(field).max_length, fallback=model._meta.model_name)
+    for attempt in range(attempts):
+        slug = allocate_slugs(model, [base], field=field, exclude_pk=instance.pk)[0]
+        setattr(instance, field, slug)
+        try:
+            with transaction.atomic(using=instance._state.db or 'default'):
+                return save()
+        except IntegrityError:
+            # Autre contrainte en échec, ou dernière tentative : l'erreur remonte telle quelle
+            taken = model._default_manager.filter(**{field: slug}).exclude(pk=instance.pk).exists()
+            if not taken or attempt == attempts - 1:
+                setattr(instance, field, '')
+                raise
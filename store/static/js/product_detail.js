@@ -4,6 +4,10 @@
             const mainImage = document.getElementById('mainImage');
             mainImage.style.opacity = 0; // Ajout d'une petite transition
             setTimeout(() => {
+                // Les <source> AVIF/WebP primeraient sur src : on bascule sur les variantes JPEG de la miniature
+                const picture = mainImage.closest('picture');
+                if (picture) picture.querySelectorAll('source').forEach(source => source.remove());
+                mainImage.srcset = (el && el.dataset.srcset) || '';
                 mainImage.src = nouvelleImageUrl;
                 mainImage.style.opacity = 1;
             }, 200);
@@ -40,7 +44,7 @@
 
         // ZOOM effet identique à votre code original
         if(mainImage) mainImage.addEventListener('click', function() {
-            zoomedImage.src = this.src;
+            zoomedImage.src = this.currentSrc || this.src;
             zoomOverlay.classList.add('active');
             document.body.style.overflow = 'hidden';
         });
@@ -0,0 +1,61 @@
+from django import template
+
+from store.renditions import MIME_TYPES, RENDITION_FAILED, RENDITION_FORMATS, RENDITION_WIDTHS, \
+    rendition_srcset as build_srcset, rendition_url as build_url
+
+register = template.Library()
+
+
+def _digest(obj, field):
+    digest = getattr(obj, f"{field}_digest", '') or ''
+    return '' if digest == RENDITION_FAILED else digest
+
+
+def _generated_width(width):
+    """ Plus petite largeur générée couvrant `width` (la plus grande à défaut) : jamais de variante absente. """
+    width = int(width)
+    return min((w for w in RENDITION_WIDTHS if w >= width), default=max(RENDITION_WIDTHS))
+
+
+def _original_url(obj, field):
+    field_file = getattr(obj, field, None)
+    return field_file.url if field_file else ''
+
+
+@register.simple_tag
+def rendition_url(obj, field, width=1280, fmt='jpeg'):
+    """ URL d'une variante pré-générée, ou du fichier original si elle n'existe pas encore. """
+    digest = _digest(obj, field)
+    return build_url(digest, _generated_width(width), fmt) if digest else _original_url(obj, field)
+
+
+@register.simple_tag
+def rendition_srcset(obj, field, fmt='jpeg'):
+    """ Attribut srcset (320w, 640w, 1280w) d'une image, vide sans variantes. """
+    digest = _digest(obj, field)
+    return build_srcset(digest, fmt) if digest else ''
+
+
+@register.inclusion_tag('store/partials/picture.html')
+def picture(obj, field, sizes='100vw', src_width=640, **attrs):
+    """
+    Balise <picture> : AVIF/WebP si le navigateur les accepte, JPEG sinon.
+    Les noms des variantes se déduisent du condensat : aucun accès à Pillow
+    ni au stockage pendant le rendu de la page.
+    `src_width` choisit la variante du src de repli (ramenée à une largeur générée) ;
+    les autres arguments, dont width et height, sont recopiés sur le <img>.
+    Ex. {% picture product "thumbnail" sizes="300px" src_width=320 alt=product.name width="300" %}
+    """
+    digest = _digest(obj, field)
+    if not digest:
+        return {'src': _original_url(obj, field), 'sources': [], 'srcset': '', 'sizes': '', 'attrs': attrs}
+    return {
+        'src': build_url(digest, _generated_width(src_width), 'jpeg'),
+        'srcset': build_srcset(digest, 'jpeg'),
+        'sizes': sizes,
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': build_srcset(digest, fmt)}
+            for fmt in RENDITION_FORMATS if fmt != 'jpeg'
+        ],
+        'attrs': attrs,
+    }
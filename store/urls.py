@@ -25,6 +25,8 @@ urlpatterns = [
     #Gestion de payement par cinetpay
     path('payment/notify/', views.cinetpay_notify, name='cinetpay_notify'),
     path('payment/return/', views.payment_return, name='payment_return'),
+    path('payment/stub/<str:transaction_id>/', views.payment_stub, name='payment_stub'),
+    path('payment/metrics/', views.payment_gateway_metrics, name='payment_gateway_metrics'),
     path("product/<slug:slug>/like/", views.toggle_like, name="toggle_like"),
 
 ]
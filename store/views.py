@@ -1,12 +1,14 @@
+import time
 from decimal import Decimal
 from django.contrib.messages import get_messages
-from django.views.decorators.cache import cache_page, never_cache
-from cinetpay import Client as Cinetpay, Config, Credential, Channels
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.db.models import F
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
@@ -14,11 +16,18 @@ from django.views.decorators.http import require_POST
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.utils import timezone
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import Paginator
 from datetime import timedelta
 from config import settings
+from store.checkout import InsufficientStock, cancel_order, place_order
 from store.filters import ProductFilter
+from store.likes import liked_products, mark_liked
 from store.forms import OrderCreateForm, ReviewForm
+from store.freshness import conditional_listing_page, conditional_product_page
+from store.pagecache import cache_shell
+from store.pagination import CursorPaginator, InvalidCursor
+from store.payments import StubGateway, PaymentError, PaymentRefused, confirm_payment, get_payment_gateway, \
+    initialize_order_payment, metrics as payment_metrics
 from store.models import Product, Category, NewsLetter, Banner, BestSeller, Toast, Promotion, Blog, Cta, CartItem, Cart, \
     Order, OrderItem, ProductLike, ReviewRating, PromoCode
 from .emails import send_order_notification, send_newsletter_subscription_email
@@ -51,7 +60,8 @@ def newsletter_subscribe(request):
     return redirect('index')
 
 # Gestion des produits
-#@cache_page(60 * 10) # Cache la page d'accueil pendant 10 minutes
+@cache_shell
+@conditional_listing_page
 def index(request):
     """
     Vue d'index pour la gestion des produits avec pagination infinie.
@@ -59,89 +69,54 @@ def index(request):
     products = Product.objects.select_related('category').prefetch_related('images').all() # OPTIMISÉ
     product_filter = ProductFilter(request.GET, queryset=products)
 
-    # Gestion session_key pour les utilisateurs anonymes
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.create()
-        session_key = request.session.session_key
-
-    # Configuration de la pagination
-    paginator = Paginator(product_filter.qs, 2)
-    page_number = request.GET.get('page', 1)
+    # Configuration de la pagination par curseur (pas de COUNT ni d'OFFSET)
+    per_page = settings.STORE_PRODUCTS_PER_PAGE
+    paginator = CursorPaginator(product_filter.qs, per_page)
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
     try:
-        page_obj = paginator.get_page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.get_page(1)
-    except EmptyPage:
-        page_obj = paginator.get_page(paginator.num_pages)
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        if is_ajax:
+            return JsonResponse({"error": _("Curseur de pagination invalide.")}, status=400)
+        page_obj = paginator.page()
 
-    # Préchargement des likes pour les produits de la page courante
-    if request.user.is_authenticated:
-        likes = ProductLike.objects.filter(
-            user=request.user,
-            product__in=page_obj.object_list
-        ).select_related('product') # OPTIMISÉ
-    else:
-        likes = ProductLike.objects.filter(
-            session_key=session_key,
-            product__in=page_obj.object_list
-        ).select_related('product') # OPTIMISÉ
-
-    liked_product_ids = set(likes.values_list("product_id", flat=True))
-
-    for product in page_obj.object_list:
-        product.is_liked = product.id in liked_product_ids
+    # Likes du visiteur lus dans le cache (aucune requête par page ou par défilement)
+    mark_liked(request, page_obj.object_list)
 
     # Si requête AJAX, retourner uniquement les produits
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+    if is_ajax:
         products_html = render_to_string("store/partials/product_list.html", {
             "products": page_obj.object_list,
         })
         return JsonResponse({
             "products_html": products_html,
             "has_next": page_obj.has_next(),
-            "next_page_number": page_obj.next_page_number() if page_obj.has_next() else 1
+            "next_cursor": page_obj.next_cursor,
         })
 
     # Featured product (logique existante) - OPTIMISÉ
     featured_product = Product.objects.select_related('category').prefetch_related('images').first()
     if featured_product:
-        if request.user.is_authenticated:
-            featured_like = ProductLike.objects.filter(
-                user=request.user,
-                product=featured_product
-            ).exists()
-        else:
-            featured_like = ProductLike.objects.filter(
-                session_key=session_key,
-                product=featured_product
-            ).exists()
-        featured_product.is_liked = featured_like
+        mark_liked(request, [featured_product])
 
     return render(request, "store/index.html", {
         "products": page_obj.object_list,
         "page_obj": page_obj,
         "featured_product": featured_product,
         "filter": product_filter,
-        "is_paginated": page_obj.has_other_pages(),
-        "page_range": paginator.get_elided_page_range(
-            page_obj.number,
-            on_each_side=2,
-            on_ends=1
-        ),
     })
 
 
 # Gestion du panier
 def cart(request):
-    cart = get_cart(request)
-    items = cart.items.select_related('product').all()
+    cart = get_cart(request, with_totals=True, create=False)
+    items = cart.items.select_related('product').all() if cart else []
 
     for item in items:
         item.total_price = item.subtotal
 
-    global_price = Decimal(cart.total_price).quantize(Decimal('0.01'))  # sécurise l'arrondi
+    global_price = Decimal(cart.total_price if cart else 0).quantize(Decimal('0.01'))  # sécurise l'arrondi
 
     return render(request, "store/cart.html", {
         "items": items,
@@ -150,20 +125,42 @@ def cart(request):
 
 
 # Gestion du recuperation du panier
-def get_cart(request):
+def session_key_for(request, create=False):
+    """
+    Clé de session du visiteur. Elle n'est créée (écriture en base et cookie)
+    qu'à la demande, lors d'une première action qui modifie son état :
+    les pages en lecture seule ne créent jamais de session.
+    """
+    if not request.session.session_key and create:
+        request.session.create()
+    return request.session.session_key
+
+
+def get_cart(request, with_totals=False, create=True):
     """
     Récupère le panier de l'utilisateur (connecté ou non)
     en pré-chargeant le code promo pour optimiser les performances.
+    Avec with_totals, le sous-total et le nombre d'articles sont lus
+    dans la même requête (voir Cart.totals).
+    Avec create=False (pages en lecture seule), ni session ni panier ne sont
+    créés : retourne None si le visiteur n'a pas encore de panier.
     """
+    carts = Cart.objects.select_related('promo_code')
+    if with_totals:
+        carts = carts.with_totals()
     if request.user.is_authenticated:
         # ✅ On ajoute select_related pour l'utilisateur connecté
-        cart, _ = Cart.objects.select_related('promo_code').get_or_create(user=request.user)
+        if not create:
+            return carts.filter(user=request.user).first()
+        cart, _ = carts.get_or_create(user=request.user)
     else:
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
+        session_key = session_key_for(request, create=create)
+        if not session_key:
+            return None
         # ✅ On ajoute AUSSI select_related pour l'utilisateur anonyme
-        cart, _ = Cart.objects.select_related('promo_code').get_or_create(session_key=session_key)
+        if not create:
+            return carts.filter(session_key=session_key).first()
+        cart, _ = carts.get_or_create(session_key=session_key)
 
     return cart
 
@@ -173,12 +170,12 @@ def get_cart(request):
 @never_cache
 def get_session_data(request):  # ✅ On renomme la fonction
     """
-    Fournit les données de session dynamiques (panier, messages)
-    pour une mise à jour via JavaScript.
+    Fournit les données de session dynamiques (panier, messages, likes,
+    jeton CSRF) pour une mise à jour via JavaScript.
     """
-    # --- Logique du panier (inchangée) ---
-    cart = get_cart(request)
-    cart_items_count = cart.items.count() if cart else 0
+    # --- Logique du panier (lecture seule : aucun panier créé) ---
+    cart = get_cart(request, with_totals=True, create=False)
+    cart_items_count = cart.totals.items_count if cart else 0
 
     # --- Logique des messages (ajoutée) ---
     messages_data = []
@@ -193,6 +190,9 @@ def get_session_data(request):  # ✅ On renomme la fonction
     return JsonResponse({
         'cart_count': cart_items_count,
         'messages': messages_data,
+        'liked_products': list(liked_products(request)),
+        # Les pages publiques en cache n'ont pas de jeton : le JavaScript le renseigne
+        'csrf_token': get_token(request),
     })
 
 
@@ -227,7 +227,8 @@ def add_to_cart(request, slug):
 
 # Gestion du detail de produit
 # + Gestion des commentaires et Evaluations
-#@cache_page(60 * 15) # Cache la page d'accueil pendant 15 minutes
+@cache_shell
+@conditional_product_page
 def detail(request, slug):
     """
     Version optimisée qui conserve exactement votre logique métier
@@ -273,6 +274,8 @@ def detail(request, slug):
             messages.success(request, _("Merci ! Votre avis a été publié."), extra_tags="detail")
             return redirect('product', slug=product.slug)
 
+    mark_liked(request, [product])
+
     context = {
         'product': product,
         'reviews': reviews,
@@ -284,8 +287,10 @@ def detail(request, slug):
 
 # Gestion du decrementation du produit
 def decrement(request, item_id):
-    cart = get_cart(request)
+    cart = get_cart(request, create=False)
     try:
+        if cart is None:
+            raise CartItem.DoesNotExist
         item = cart.items.get(product_id=item_id)
         if item.quantity > 1:
             item.quantity -= 1
@@ -301,7 +306,7 @@ def decrement(request, item_id):
 
 # Gestion de la suppression du produit
 def delete_item(request, item):
-    cart = get_cart(request)  # récupère le panier approprié
+    cart = get_cart(request, create=False)  # récupère le panier approprié
     cart_item = get_object_or_404(CartItem, cart=cart, product_id=item)
     cart_item.delete()
     messages.success(request, _('Vous avez supprimé un produit de votre panier'), extra_tags="cart")
@@ -309,7 +314,7 @@ def delete_item(request, item):
 
 # Gestion de la suppression de tout le produit d'un seul coup
 def empty_cart(request):
-    cart = get_cart(request)  # récupère le panier approprié
+    cart = get_cart(request, create=False)  # récupère le panier approprié
     if cart:
         cart.items.all().delete()
         messages.success(request, _('Votre panier a été vidé avec succès.'), extra_tags="cart")
@@ -344,114 +349,96 @@ def apply_promo_code(request):
     return redirect('cart')
 
 # Gestion des commandes avec vérification et décrémentation du stock
-@transaction.atomic
+def _record_order(request, form, lines, promo_code=None):
+    """
+    Première phase de la commande : enregistre la commande (en attente) et
+    réserve le stock dans une transaction courte. L'e-mail de confirmation
+    est mis en file dans la même transaction et envoyé par send_queued_emails.
+    """
+    started = time.perf_counter()
+    order = form.save(commit=False)
+
+    if request.user.is_authenticated:
+        order.user = request.user
+    else:
+        order.session_key = session_key_for(request, create=True)
+
+    with transaction.atomic():
+        place_order(order, lines, promo_code=promo_code)
+        order.transaction_id = f"ORDER-{order.id}-{int(timezone.now().timestamp())}"
+        order.save(update_fields=['transaction_id'])
+        send_order_notification(order.id, is_new_order=True)
+
+    print(f"Commande {order.id} enregistrée (section base de données : {(time.perf_counter() - started) * 1000:.0f} ms)")
+    return order
+
+
+def _start_payment(request, order, description, extra_tags):
+    """
+    Seconde phase : initialisation du paiement hors transaction. En cas d'échec
+    la commande est annulée et son stock remis en vente (compensation).
+    Retourne la redirection vers la page de paiement, ou None.
+    """
+    started = time.perf_counter()
+    try:
+        payment_link = initialize_order_payment(order, description)
+    except PaymentRefused:
+        cancel_order(order.id)
+        messages.error(request, _("Le service de paiement a refusé la transaction. Veuillez réessayer."),
+                       extra_tags=extra_tags)
+        return None
+    except PaymentError:
+        cancel_order(order.id)
+        messages.error(request, _("Une erreur technique est survenue. Veuillez réessayer plus tard."),
+                       extra_tags=extra_tags)
+        return None
+    finally:
+        print(f"Commande {order.id} : initialisation du paiement en {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    request.session['order_id'] = order.id
+    return redirect(payment_link)
+
+
 def create_order(request):
+    # Totaux agrégés dans la même requête, articles et produits préchargés une fois
+    carts = Cart.objects.with_totals().select_related('promo_code').prefetch_related('items__product')
     if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
+        cart = carts.filter(user=request.user).first()
     else:
-        session_key = request.session.session_key
-        cart = Cart.objects.filter(session_key=session_key).first()
+        session_key = session_key_for(request)
+        cart = carts.filter(session_key=session_key).first() if session_key else None
 
-    if not cart or not cart.items.exists():
+    if not cart or not cart.totals.items_count:
         messages.warning(request, _("Votre panier est vide."), extra_tags="cart")
         return redirect('cart')
 
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            # ✅ 1. VÉRIFICATION FINALE DU STOCK AVANT DE CRÉER LA COMMANDE
-            for item in cart.items.all():
-                product = item.product
-                if product.stock < item.quantity:
-                    messages.error(
-                        request,
-                        _("Stock insuffisant pour {product_name}. Il ne reste que {stock_count} unités. Veuillez mettre à jour votre panier.").format(
-                            product_name=product.name,
-                            stock_count=product.stock
-                        ),
-                        extra_tags="cart"
-                    )
-                    return redirect('cart')
-
-            order = form.save(commit=False)
-            order.total_paid = cart.total_price
-
-            if request.user.is_authenticated:
-                order.user = request.user
-            else:
-                if not request.session.session_key:
-                    request.session.create()
-                order.session_key = request.session.session_key
-
-            if cart.promo_code and cart.promo_code.is_valid():
-                order.promo_code = cart.promo_code
-
-            order.save()
-
-            # ✅ 2. CRÉATION DES ARTICLES DE COMMANDE ET DÉCRÉMENTATION DU STOCK
-            for item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    price=item.product.current_price,
-                    quantity=item.quantity
+            # ✅ 1. VÉRIFICATION DU STOCK, CRÉATION DES ARTICLES ET DÉCRÉMENTATION (produits verrouillés)
+            try:
+                order = _record_order(
+                    request, form,
+                    [(item.product_id, item.quantity) for item in cart.items.all()],
+                    promo_code=cart.promo_code
+                )
+            except InsufficientStock as exc:
+                messages.error(
+                    request,
+                    _("Stock insuffisant pour {product_name}. Il ne reste que {stock_count} unités. Veuillez mettre à jour votre panier.").format(
+                        product_name=exc.product_name,
+                        stock_count=exc.available
+                    ),
+                    extra_tags="cart"
                 )
-                # Décrémentation du stock de manière sécurisée (évite les race conditions)
-                Product.objects.filter(id=item.product.id).update(stock=F('stock') - item.quantity)
-
-            # On envoie l'e-mail ici pour les tests locaux.
-            send_order_notification(order.id, is_new_order=True)
-
-            transaction_id = f"ORDER-{order.id}-{int(timezone.now().timestamp())}"
-            order.transaction_id = transaction_id
-            order.save(update_fields=['transaction_id'])
-
-            # NOTE: En production, settings.SITE_URL doit être votre nom de domaine
-            notify_url = settings.SITE_URL + reverse('cinetpay_notify')
-            return_url = settings.SITE_URL + reverse('payment_return')
-
-            credentials = Credential(
-                api_key=settings.CINETPAY_API_KEY,
-                site_id=int(settings.CINETPAY_SITE_ID),
-                secret_key=settings.CINETPAY_SECRET_KEY,
-            )
-            configs = Config(
-                credentials=credentials, currency='XOF', language='fr', channels=Channels.ALL,
-                lock_phone_number=False, raise_on_error=False,
-                mode='PROD'  # 👈 IMPORTANT: Changer pour 'PROD' en production
-            )
-            client = Cinetpay(configs)
-
-            payment_data = {
-                'amount': int(order.total_paid),
-                'currency': 'XOF',
-                'transaction_id': transaction_id,
-                'description': f'Paiement pour la commande #{order.id}',
-                'return_url': return_url,
-                'notify_url': notify_url,
-                'customer_name': f"{order.first_name} {order.last_name}",
-                'customer_surname': order.last_name,
-                'customer_email': order.email,
-                'customer_phone_number': order.phone,
-            }
+                return redirect('cart')
 
-            try:
-                response = client.initialize_transaction(payment_data)
-                if response['code'] == '201':
-                    payment_link = response['data']['payment_url']
-                    request.session['order_id'] = order.id
-                    cart.delete()  # Le panier est vidé seulement si le paiement est initié
-                    return redirect(payment_link)
-                else:
-                    # Si CinetPay refuse, la transaction est annulée grâce à @transaction.atomic
-                    messages.error(request, _("Le service de paiement a refusé la transaction. Veuillez réessayer."),
-                                   extra_tags="cart")
-                    return redirect('cart')
-            except Exception:
-                # Si une erreur survient, la transaction est annulée
-                messages.error(request, _("Une erreur technique est survenue. Veuillez réessayer plus tard."),
-                               extra_tags="cart")
+            # ✅ 2. PAIEMENT, UNE FOIS LA COMMANDE VALIDÉE EN BASE
+            response = _start_payment(request, order, f'Paiement pour la commande #{order.id}', 'cart')
+            if response is None:
                 return redirect('cart')
+            cart.delete()  # Le panier est vidé seulement si le paiement est initié
+            return response
     else:
         initial_data = {}
         if request.user.is_authenticated:
@@ -462,7 +449,6 @@ def create_order(request):
     return render(request, 'store/create_order.html', {'cart': cart, 'form': form})
 
 #  Gestion des commandes sans panier avec gestion du stock
-@transaction.atomic
 def create_single_product_order(request, slug):
     product = get_object_or_404(Product, slug=slug)
 
@@ -474,65 +460,18 @@ def create_single_product_order(request, slug):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            order = form.save(commit=False)
-            order.total_paid = product.current_price
-
-            if request.user.is_authenticated:
-                order.user = request.user
-            else:
-                if not request.session.session_key:
-                    request.session.create()
-                order.session_key = request.session.session_key
-
-            order.save()
-            OrderItem.objects.create(order=order, product=product, price=product.current_price, quantity=1)
-
-            # ✅ 2. DÉCRÉMENTATION DU STOCK
-            product.stock = F('stock') - 1
-            product.save(update_fields=['stock'])
-
-            # 📧 ENVOI DE L'EMAIL DE CONFIRMATION
-            send_order_notification(order.id, is_new_order=True)
-
-            transaction_id = f"ORDER-{order.id}-{int(timezone.now().timestamp())}"
-            order.transaction_id = transaction_id
-            order.save(update_fields=['transaction_id'])
-
-            # NOTE: En production, settings.SITE_URL doit être votre nom de domaine
-            notify_url = settings.SITE_URL + reverse('cinetpay_notify')
-            return_url = settings.SITE_URL + reverse('payment_return')
-
-            credentials = Credential(
-                api_key=settings.CINETPAY_API_KEY,
-                site_id=int(settings.CINETPAY_SITE_ID),
-                secret_key=settings.CINETPAY_SECRET_KEY,
-            )
-            configs = Config(
-                credentials=credentials, currency='XOF', language='fr', channels=Channels.ALL,
-                lock_phone_number=False, raise_on_error=False,
-                mode='PROD'  # 👈 IMPORTANT: Changer pour 'PROD' en production
-            )
-            client = Cinetpay(configs)
-
-            payment_data = {
-                'amount': int(order.total_paid), 'currency': 'XOF', 'transaction_id': transaction_id,
-                'description': f'Achat direct pour {product.name}', 'return_url': return_url, 'notify_url': notify_url,
-                'customer_name': f"{order.first_name} {order.last_name}", 'customer_email': order.email,
-                'customer_phone_number': order.phone,
-            }
-
+            # ✅ 2. CRÉATION DE L'ARTICLE ET DÉCRÉMENTATION DU STOCK (produit verrouillé)
             try:
-                response = client.initialize_transaction(payment_data)
-                if response['code'] == '201':
-                    payment_link = response['data']['payment_url']
-                    request.session['order_id'] = order.id
-                    return redirect(payment_link)
-                else:
-                    messages.error(request, _("Le service de paiement a refusé la transaction. Veuillez réessayer."), extra_tags="payment")
-                    return redirect('product', slug=slug)
-            except Exception:
-                messages.error(request, _("Une erreur technique est survenue. Veuillez réessayer plus tard."), extra_tags="payment")
+                order = _record_order(request, form, [(product.id, 1)])
+            except InsufficientStock:
+                messages.error(request, _("Ce produit n'est plus disponible à la vente."), extra_tags="payment")
+                return redirect('product', slug=slug)
+
+            # ✅ 3. PAIEMENT, UNE FOIS LA COMMANDE VALIDÉE EN BASE
+            response = _start_payment(request, order, f'Achat direct pour {product.name}', 'payment')
+            if response is None:
                 return redirect('product', slug=slug)
+            return response
     else:
         initial_data = {}
         if request.user.is_authenticated:
@@ -551,34 +490,10 @@ def cinetpay_notify(request):
             return JsonResponse({'status': 'error', 'message': _('ID de transaction manquant')}, status=400)
 
         try:
-            credentials = Credential(
-                api_key=settings.CINETPAY_API_KEY,
-                site_id=int(settings.CINETPAY_SITE_ID),
-                secret_key=settings.CINETPAY_SECRET_KEY,
-            )
-            configs = Config(
-                credentials=credentials, currency='XOF', language='fr', channels=Channels.ALL,
-                lock_phone_number=False, raise_on_error=False,
-                mode='PROD'  # 👈 IMPORTANT: Changer pour 'PROD' en production
-            )
-            client = Cinetpay(configs)
-
-            response = client.get_transaction(transaction_id)
-            order = Order.objects.get(transaction_id=transaction_id)
-
-            if response.get('code') == '00':
-                order.paid = True
-                order.status = Order.StatusChoices.PROCESSING
-                order.save(update_fields=['paid', 'status'])
+            if confirm_payment(transaction_id):
                 return JsonResponse({'status': 'success'})
-            else:
-                order.status = Order.StatusChoices.CANCELED
-                order.save(update_fields=['status'])
-                # 💡 CONSEIL : Ici, vous pourriez implémenter la logique pour remettre les produits en stock
-                # en cas d'annulation de paiement.
-                # for item in order.items.all():
-                #     Product.objects.filter(id=item.product.id).update(stock=F('stock') + item.quantity)
-                return JsonResponse({'status': 'failed'})
+            # Paiement refusé : la commande est annulée et ses produits remis en stock
+            return JsonResponse({'status': 'failed'})
 
         except Order.DoesNotExist:
             return JsonResponse({'status': 'error', 'message': _('Commande non trouvée')}, status=404)
@@ -586,6 +501,24 @@ def cinetpay_notify(request):
             return JsonResponse({'status': 'error', 'message': _('Erreur interne du serveur')}, status=500)
     return JsonResponse({'status': 'error', 'message': _('Méthode non autorisée')}, status=405)
 
+# Gestion de la page de paiement simulée (STORE_PAYMENT_BACKEND = StubGateway)
+def payment_stub(request, transaction_id):
+    if not isinstance(get_payment_gateway(), StubGateway):
+        raise Http404
+    try:
+        confirm_payment(transaction_id)
+    except Order.DoesNotExist:
+        raise Http404
+    except PaymentError:
+        pass  # comme le vrai service : le client revient sans confirmation
+    return redirect('payment_return')
+
+# Gestion des mesures de la passerelle de paiement (processus courant)
+@staff_member_required
+@never_cache
+def payment_gateway_metrics(request):
+    return JsonResponse(payment_metrics.snapshot())
+
 # Gestion de confirmation du payement
 def payment_return(request):
     order_id = request.session.get('order_id')
@@ -627,24 +560,23 @@ def toggle_like(request, slug):
     if request.user.is_authenticated:
         like, created = ProductLike.objects.get_or_create(product=product, user=request.user)
     else:
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.create()
-            session_key = request.session.session_key
+        session_key = session_key_for(request, create=True)
         like, created = ProductLike.objects.get_or_create(product=product, session_key=session_key)
 
     if not created:
         # le like existait → on le supprime (unlike)
         like.delete()
         is_liked = False
+        product.likes_count = max(product.likes_count - 1, 0)
         messages.success(request, _("Vous avez disliké ce produit"), extra_tags="likes")
     else:
         is_liked = True
+        product.likes_count += 1
         messages.success(request, _("Vous avez liké ce produit"), extra_tags="likes")
 
     # 🔹 pour un usage AJAX
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        return JsonResponse({"liked": is_liked, "likes_count": product.likes.count()})
+        return JsonResponse({"liked": is_liked, "likes_count": product.likes_count})
 
     # sinon simple redirection
     return redirect(request.META.get("HTTP_REFERER", "index"))
@@ -653,19 +585,17 @@ def toggle_like(request, slug):
 #@never_cache
 @login_required
 def order_history(request):
-    # 🔑 Récupération de la session_key pour les invités
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.create()
-        session_key = request.session.session_key
+    # 🔑 Récupération de la session_key pour les invités (sans en créer une)
+    session_key = session_key_for(request)
 
     # ✅ Commandes pour l'utilisateur connecté OU invité
     if request.user.is_authenticated:
         orders = Order.objects.filter(user=request.user)
     else:
-        orders = Order.objects.filter(session_key=session_key)
+        orders = Order.objects.filter(session_key=session_key) if session_key else Order.objects.none()
 
-    orders = orders.order_by('-created_at')
+    # Nombre d'articles, sous-total et aperçu des trois premiers articles : nombre de requêtes fixe par page
+    orders = orders.with_summary(preview=3).order_by('-created_at')
 
     # ✅ Appliquer les filtres
     status_filter = request.GET.get('status', 'all')
@@ -704,17 +634,14 @@ def order_history(request):
 #@never_cache
 @login_required
 def order_detail(request, order_id):
-    # 🔑 Récupération de la session_key pour les invités
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.create()
-        session_key = request.session.session_key
+    # 🔑 Récupération de la session_key pour les invités (sans en créer une)
+    session_key = session_key_for(request)
 
     # 🔹 Récupération de la commande
     if request.user.is_authenticated:
         order = get_object_or_404(Order, id=order_id, user=request.user)
     else:
-        order = get_object_or_404(Order, id=order_id, session_key=session_key)
+        order = get_object_or_404(Order, id=order_id, session_key=session_key or '')
 
     return render(request, 'store/order_detail.html', {'order': order})
 